@@ -2,10 +2,16 @@
 Module used to create a Tetris playing agent
 Created by JRIngram 
 """
-from tetrominoes import list_of_tetrominoes
-import copy, time, random, csv
-from keras.models import Sequential
-from keras.layers import Dense
+from pieces import piece_of, geometry
+from features import board_features, MAXIMUM_COLUMN_DIFFERENCE
+from forward import ForwardNet
+from batchmatris import piece_encodings, valid_action_masks
+from replay import ReplayMemory
+from seeds import load_seeds
+from results import ResultsWriter
+from checkpoint import write_atomic
+from training_log import logger, format_board
+import copy, time, random
 import numpy as np
 import pickle
 
@@ -21,6 +27,10 @@ class board():
     column_heights = 0
     holes_per_column = []
     column_differences = []
+    height_difference_punishment = 0
+
+    #When True, every delta update by update_features is checked against a full rescan of the board
+    check_updates = False
     
     def __init__(self, board_representation=[]):
         """
@@ -45,14 +55,101 @@ class board():
         Returns the board as a series of rows, each corresponding to a row in the board.
         """
         #Note: board will be 22 in height as Matris uses the top two columns as the initial appearance of tetrominos on the board
-        board_string = ""
-        for row in self.board_representation:
-            for x in range(len(row)):
-                if(x == len(row) - 1):
-                    board_string = board_string + str(row[x]) + "\n"
-                else:
-                    board_string = board_string + str(row[x]) + ","
-        return board_string
+        return format_board(self.board_representation)
+
+    def set_features(self):
+        """
+        Calculates every feature of the board in one pass over the board representation:
+        the height of each column, the highest column height, the cumulative height
+        column1(height) + column2(height) + ... + columnN(height), the holes in each column,
+        the column differences and the height difference punishment.
+        """
+        features = board_features(self.board_representation)
+        self.column_heights = features.heights.tolist()
+        self.board_height = int(features.max_height)
+        self.cum_height = int(features.cum_height)
+        self.holes_per_column = features.holes_per_column.tolist()
+        self.column_differences = features.column_differences.tolist()
+        self.height_difference_punishment = int(features.punishment)
+
+    def update_features(self, placed_cells, cleared_rows):
+        """
+        Updates the board representation and its features after a tetromino is locked.
+        `placed_cells` holds the (row, column) of every cell of the tetromino, as it was placed,
+        and `cleared_rows` the rows that were then full and removed.
+
+        Only the columns the tetromino covers are scanned again. Clearing rows lowers every other column
+        by the number of rows cleared without changing its holes, as a full row is never above the top of a column;
+        a column whose top cell was cleared is scanned again.
+        If the features have not been calculated yet, or check_updates is set and the result differs
+        from a full rescan, the whole board is scanned with set_features instead.
+        """
+        representation = self.board_representation
+        for y, x in placed_cells:
+            representation[y][x] = 1
+        features_set = len(self.holes_per_column) == len(representation[0])
+        if features_set:
+            for x in set(x for y, x in placed_cells):
+                self.column_heights[x], self.holes_per_column[x] = self.scan_column(x)
+
+        if cleared_rows:
+            cleared = set(cleared_rows)
+            rows = len(representation)
+            width = len(representation[0])
+            self.board_representation = [[0] * width for _ in cleared] + [representation[y] for y in range(rows) if y not in cleared]
+            if features_set:
+                for x in range(width):
+                    if rows - self.column_heights[x] in cleared:
+                        self.column_heights[x], self.holes_per_column[x] = self.scan_column(x)
+                    else:
+                        self.column_heights[x] -= len(cleared)
+
+        if not features_set:
+            self.set_features()
+            return
+        self.set_height_features()
+
+        if self.check_updates:
+            self.check_features()
+
+    def scan_column(self, x):
+        """
+        Returns the height of column x and the number of holes in it
+        """
+        rows = len(self.board_representation)
+        for y in range(rows):
+            if self.board_representation[y][x] == 1:
+                holes = 0
+                for below in range(y + 1, rows):
+                    if self.board_representation[below][x] == 0:
+                        holes = holes + 1
+                return rows - y, holes
+        return 0, 0
+
+    def set_height_features(self):
+        """
+        Calculates the features that only depend on the column heights
+        """
+        column_heights = self.column_heights
+        self.board_height = max(column_heights)
+        self.cum_height = sum(column_heights)
+        self.height_difference_punishment = self.board_height - min(column_heights)
+        self.column_differences = [0] + [max(-MAXIMUM_COLUMN_DIFFERENCE, min(MAXIMUM_COLUMN_DIFFERENCE, column_heights[x-1] - column_heights[x]))
+                                         for x in range(1, len(column_heights))]
+
+    def check_features(self):
+        """
+        Compares the features with a full rescan of the board.
+        Returns True if they match; otherwise the rescanned features are kept and False is returned.
+        """
+        features = board_features(self.board_representation)
+        if (features.heights.tolist() == self.column_heights
+                and features.holes_per_column.tolist() == self.holes_per_column
+                and features.column_differences.tolist() == self.column_differences):
+            return True
+        logger.warning("Board features were out of date. Rescanning the whole board:\n%s", self)
+        self.set_features()
+        return False
 
     def set_board_height(self):
         """
@@ -60,17 +157,7 @@ class board():
         Also assigns the height of each individual column when calculating
         Also assigns cumulative height value: column1(height) + column2(height) + ... + columnN(height)
         """
-        column_heights = [];
-        for x in range(len(self.board_representation[0])): #Number of columns
-            for y in range (len(self.board_representation)): #Number of rows
-                if(self.board_representation[y][x] == 1):
-                    column_heights.append(22 - y) #Matris height is 22
-                    break
-                elif(y == 21): #Column is empty
-                    column_heights.append(0)
-        self.board_height = max(column_heights)
-        self.cum_height = sum(column_heights)
-        self.column_heights = column_heights
+        self.set_features()
     
     def get_board_height(self):
         """
@@ -79,19 +166,10 @@ class board():
         return self.board_height
     
     def get_height_difference_punishment(self):
-        top = self.board_height
-        column_heights = [];
-        for x in range(len(self.board_representation[0])): #Number of columns
-            for y in range (len(self.board_representation)): #Number of rows
-                if(self.board_representation[y][x] == 1):
-                    column_heights.append(22 - y) #Matris height is 22
-                    break
-                elif(y == 21): #Column is empty
-                    column_heights.append(0)
-        bottom = min(column_heights)
-        punishment = top - bottom
-        return punishment  
-        
+        """
+        Returns the height of the highest column minus the height of the lowest column
+        """
+        return self.height_difference_punishment
 
     def get_cum_height(self):   
         """
@@ -105,19 +183,7 @@ class board():
         A hole is a cell that is below a full cell in a column:
             e.g. if cell was full at height 3, and all cells below that were empty, there would be 2 holes.  
         """
-        holes_per_column = []
-        for x in range(len(self.board_representation[0])): #Number of columns
-            holes_in_column = 0
-            below_full_cell = False
-            for y in range (len(self.board_representation)): #Number of rows
-                if(self.board_representation[y][x] == 1 and below_full_cell == False):
-                    #Marks if a column has an occupied cell
-                    below_full_cell = True
-                if(below_full_cell == True and self.board_representation[y][x] == 0):
-                    #Adds +1 to hole count for each empty cell below an occupied cell
-                    holes_in_column = holes_in_column + 1
-            holes_per_column.append(holes_in_column)
-        self.holes_per_column = holes_per_column
+        self.set_features()
     
     def get_holes(self):
         """
@@ -130,26 +196,7 @@ class board():
         Calculates the difference in height between a column and the column to the left of it.
         This is calculate for all columns and then returned as a list.
         """
-        column_heights = [];
-        for x in range(len(self.board_representation[0])): #Number of columns
-            for y in range (len(self.board_representation)): #Number of rows
-                if(self.board_representation[y][x] == 1):
-                    column_heights.append(22 - y) #Matris height is 22
-                    break
-                elif(y == 21): #Column is empty
-                    column_heights.append(0)
-        column_differences = [0] * len(column_heights)
-        for x in range(len(column_heights)):
-            if x == 0:
-                column_differences[x] = 0
-            else:
-                column_differences[x] = column_heights[x-1] - column_heights[x]
-        for x in range(0, len(column_differences)):
-            if column_differences[x] > 4:
-                column_differences[x] = 4
-            elif column_differences[x] < -4:
-                column_differences[x] = -4
-        self.column_differences = column_differences
+        self.set_features()
     
     def get_column_differences(self):
         """
@@ -166,8 +213,40 @@ class board():
             return True
         else:
             return False
+
+
+class afterstate():
+    """
+    A board after a tetromino has been dropped on it, before any lines are cleared.
+    Stored as the board the tetromino was dropped on and the (row, column) of its cells;
+    the resulting board is only built when it is asked for, so it must be used before that board changes.
+    """
+
+    def __init__(self, board, cells):
+        self.board = board
+        self.cells = cells
+
+    def skyline_occuppied(self):
+        """
+        Checks if the top two rows would be occupied once the tetromino is placed
+        """
+        return self.board.skyline_occuppied() or any(y < 2 for y, x in self.cells)
+
+    def get_board(self):
+        """
+        Returns the board with the tetromino placed, as a new board with its features calculated
+        """
+        representation = [list(row) for row in self.board.board_representation]
+        for y, x in self.cells:
+            representation[y][x] = 1
+        placed_board = board(representation)
+        placed_board.set_features()
+        return placed_board
     
     
+#Columns of the results csv
+RESULTS_HEADER = ["episode", "lines", "score", "pieces", "epsilon", "wall_time", "steps_per_second"]
+
 class agent():
     """
     Agent that will learn to play Tetris.
@@ -190,7 +269,6 @@ class agent():
     epsilon=0
     epsilon_decay=0
     discount = 0
-    event_memory = []
     memory_size = 0
     sample_size = 0
     reset_steps = 0 
@@ -205,13 +283,27 @@ class agent():
     #Used for state action recording
     previous_state = None
     previous_action = None
+
+    #Valid placements of the current tetromino on the current board, worked out once per turn
+    valid_placements = None
     
     #Used to mark if the agent is the 10 output ANN
     supervised = False
+
+    #Fraction of the way the target_net moves towards the current_net every step; None to copy it every reset_steps
+    target_tau = None
+
+    #Networks and their NumPy copies; only built for agents that learn
+    current_net = None
+    target_net = None
+    current_forward = None
+    target_forward = None
     
-    def __init__(self, tetromino=[], episodes=1, random_moves=True, rewards_as_lines=False, epsilon=0.1, discount=0.99,  epsilon_decay=0, epsilon_minimum=0.01, memory_size=1000, sample_size=32, reset_steps=1000, height=False, holes=False, filepath=None, supervised=False):
+    def __init__(self, tetromino=[], episodes=1, random_moves=True, rewards_as_lines=False, epsilon=0.1, discount=0.99,  epsilon_decay=0, epsilon_minimum=0.01, memory_size=1000, sample_size=32, reset_steps=1000, height=False, holes=False, filepath=None, supervised=False, results_path=None, target_tau=None, seeds=None, memory_path=None):
         self.agent_tetromino = tetromino
         self.number_of_episodes = episodes
+        #Seed of the game of every episode, from seeds.npy (or seeds.csv) unless a SeedStore is given
+        self.seeds = seeds if seeds is not None else load_seeds()
         self.rand = random.Random(self.load_new_seed())
         self.random_moves = random_moves
         self.rewards_as_lines = rewards_as_lines
@@ -221,14 +313,51 @@ class agent():
         self.epsilon_decay = epsilon_decay
         self.epsilon_minimum = epsilon_minimum
         self.discount = discount
-        self.event_memory = []
         self.memory_size = memory_size
-        self.event_memory = []
         self.sample_size = sample_size
         self.reset_steps = reset_steps 
+        self.target_tau = target_tau
         
         self.holes = holes
         self.height = height
+        #Only a learning agent needs networks, and with them Keras
+        if self.random_moves == False:
+            self.build_networks(filepath)
+
+        #Replay memory; the remembered states hold the tetromino, the column differences, and holes and height if used.
+        #With a memory_path the events are kept in that file, and the events already in it are used
+        self.event_memory = ReplayMemory(self.memory_size, 18 + (self.holes == True) + (self.height == True), piece_encodings, path=memory_path)
+        
+        #Create a csv file to store results with file path depending on mode, unless a path was given
+        if results_path is not None:
+            self.file_path = results_path
+        elif self.random_moves == True:
+            self.file_path = "results/RA-results-" + str(time.strftime("%d-%m-%y_%H:%M:%S"))
+        elif self.holes == False and self.height == False:
+            self.file_path = "results/NO-results-" + str(time.strftime("%d-%m-%y_%H:%M:%S"))
+        elif self.holes == True and self.height == False:
+            self.file_path = "results/HO-results-" + str(time.strftime("%d-%m-%y_%H:%M:%S"))
+        elif self.holes == False and self.height == True:
+            self.file_path = "results/HI-results-" + str(time.strftime("%d-%m-%y_%H:%M:%S"))
+        elif self.holes == True and self.height == True:
+            self.file_path = "results/HH-results-" + str(time.strftime("%d-%m-%y_%H:%M:%S"))
+        else:
+            #Generic filepath
+            self.file_path = "results/results-" + str(time.strftime("%d-%m-%y_%H:%M:%S"))
+        #Results are written in batches rather than with a file open every episode
+        self.results = ResultsWriter(self.file_path + str(".csv"), header=RESULTS_HEADER, truncate=True)
+        self.episode_start = time.time()
+            
+    
+    def build_networks(self, filepath=None):
+        """
+        Creates current_net, or loads it and the agent's epsilon, holes and height from `filepath`.obj,
+        then target_net and the NumPy copies of both.
+        Keras is imported here rather than with this module, so agents that do not learn start without it.
+        """
+        from keras.models import Sequential, clone_model
+        from keras.layers import Dense
+
         #Initialize action-value function Q with random weights
         self.current_net = Sequential()
 
@@ -258,27 +387,14 @@ class agent():
             self.holes = loaded_agent_information[1]
             self.height = loaded_agent_information[2]
             self.current_net = loaded_agent_information[3]
-        
-        #Initialize target action-value function Q
-        self.target_net = copy.deepcopy(self.current_net)
-        
-        #Create a csv file to store results with file path depending on mode
-        if self.random_moves == True:
-            self.file_path = "results/RA-results-" + str(time.strftime("%d-%m-%y_%H:%M:%S"))
-        elif self.holes == False and self.height == False:
-            self.file_path = "results/NO-results-" + str(time.strftime("%d-%m-%y_%H:%M:%S"))
-        elif self.holes == True and self.height == False:
-            self.file_path = "results/HO-results-" + str(time.strftime("%d-%m-%y_%H:%M:%S"))
-        elif self.holes == False and self.height == True:
-            self.file_path = "results/HI-results-" + str(time.strftime("%d-%m-%y_%H:%M:%S"))
-        elif self.holes == True and self.height == True:
-            self.file_path = "results/HH-results-" + str(time.strftime("%d-%m-%y_%H:%M:%S"))
-        else:
-            #Generic filepath
-            self.file_path = "results/results-" + str(time.strftime("%d-%m-%y_%H:%M:%S"))
-        with open(self.file_path + str(".csv"), 'w+') as results_file:
-            results_file.write("episode,results" + "\n")
-            
+
+        #Initialize target action-value function Q with the same layers, then copy the weights of current_net into it
+        self.target_net = clone_model(self.current_net)
+        self.target_net.set_weights(self.current_net.get_weights())
+
+        #NumPy copies of both networks answer every query; Keras is only used to fit current_net
+        self.current_forward = ForwardNet(self.current_net)
+        self.target_forward = ForwardNet(self.target_net)
     
     def set_agent_tetromino(self, tetromino):
         """
@@ -286,34 +402,13 @@ class agent():
         Each tetromino is stored 4 times as the tetromino can rotate 4 times.
         Tetromino is stored as 0 for an empty cell in the matrix or 1 for a full cell in the matrix.
         E.g. an "L" tetromino is stored as
-            [[0,1,0]
-             [0,1,0]
-             [0,1,1]]
-        """
-        self.agent_tetromino = []
-        self.agent_tetromino.append(self.convert_tetromino(tetromino))
-        for x in range (0,3):
-            self.agent_tetromino.append(self.rotate_agent_tetromino(self.agent_tetromino[x]))
-    
-    def convert_tetromino(self, tetromino):
+            ((0,1,0)
+             (0,1,0)
+             (0,1,1))
+        The rotations are taken from the table in pieces.py rather than worked out again.
         """
-        Converts a tetromino from the O,X representation in tetrominos.py to the 0 and 1 representation used by the agent.
-        
-        E.g. "O" tetromino is converted in the following way:
-        
-            [[X,X]     [[1, 1]
-             [X,X]] =>  [1, 1]]
-        """
-        tetromino_array = []
-        for x in range(len(tetromino[2])):
-            tetromino_row = []
-            for y in range(len(tetromino[2][x])):
-                if tetromino[2][x][y] == 'X':
-                    tetromino_row.append(1)
-                else:
-                    tetromino_row.append(0)
-            tetromino_array.append(tetromino_row)
-        return tetromino_array
+        self.agent_tetromino = [rotation.cells for rotation in piece_of(tetromino).rotations]
+        self.valid_placements = None
     
     def get_agent_tetromino(self):
         """
@@ -321,25 +416,12 @@ class agent():
         """
         return self.agent_tetromino
     
-    def rotate_agent_tetromino(self, tetromino):
-        """
-        Returns a rotation of the agent's current tetromino.
-        Used to calculate all rotations for that tetromino in set_agent_tetromino
-        """
-        rotating_tetromino = tetromino
-        rotated_tetromino = []
-        for x in range(len(rotating_tetromino)):
-            column = []
-            for y in range(len(rotating_tetromino)):
-                column.append(rotating_tetromino[y][x])
-            rotated_tetromino.append(list(reversed(column)))
-        return rotated_tetromino
-    
     def set_current_board(self, board):
         """
         Sets the current board representation for the 
         """
         self.current_board = board  
+        self.valid_placements = None
     
     def get_current_board(self):
         """
@@ -367,7 +449,7 @@ class agent():
         Checks if the game board is in a terminal state
         """
         if self.current_board.skyline_occuppied() == True:
-            print("Game Over: Skyline occupied")
+            logger.debug("Game Over: Skyline occupied")
             return True
         possible_placements = self.find_valid_placements()
         rotations_with_remaining_placements = []
@@ -376,7 +458,7 @@ class agent():
                 rotations_with_remaining_placements.append(x)
         if len(rotations_with_remaining_placements) == 0:
             #Ends game if no valid placements remain.
-            print("Game Over: No rotations with remaining placements.")
+            logger.debug("Game Over: No rotations with remaining placements.")
             return True
         
         return False
@@ -398,23 +480,16 @@ class agent():
             rotation = rotations_with_remaining_placements[random.randint(0, len(rotations_with_remaining_placements) - 1)]         
             number_of_placements = len(possible_placements[rotation])-1
         placement_option = random.randint(0,number_of_placements)
-        
-        #rotation,height,column
-        placement = [rotation,possible_placements[rotation][placement_option][0][2],possible_placements[rotation][placement_option][0][1]]
+        coordinate_tag, chosen_board = possible_placements[rotation][placement_option]
+        self.previous_action = self.action_node(coordinate_tag)
         
         #Checks if top two columns are filled by the chosen placement
-        for option in range(len(possible_placements[placement[0]])):
-            if possible_placements[placement[0]][option][0][1] == placement[2]:
-                chosen_board = possible_placements[placement[0]][option][1]
-                if chosen_board.skyline_occuppied():
-                    print("Game Over: Option chosen where skyline occupied")
-                    self.previous_action = copy.deepcopy(placement)
-                    return False
-                else:
-                    break
+        if chosen_board.skyline_occuppied():
+            logger.debug("Game Over: Option chosen where skyline occupied")
+            return False
                 
-        #Check if top two rows filled
-        placement[2] = placement[2] - possible_placements[rotation][placement_option][0][3] #Corrects column placement after trimming
+        #rotation,height,column - left trimmed
+        placement = [rotation, coordinate_tag[2], coordinate_tag[1] - coordinate_tag[3]]
         self.previous_state = self.__format_previous_state()
         return placement
         
@@ -496,35 +571,30 @@ class agent():
                 for option in range(0,len(possible_actions[rotation])):
                     #For each option for each rotation check the value
                     if self.supervised == False or (self.supervised == True and rotation == 0):
-                        output_node = (rotation*10) + option #output node to retrieve the predicted value from.
+                        output_node = self.action_node(possible_actions[rotation][option][0]) #output node to retrieve the predicted value from.
                         node_value = predicted_values[0][output_node]
                         if optimal_placement == None:
-                            optimal_placement = [possible_actions[rotation][option][0], node_value]
+                            optimal_placement = [possible_actions[rotation][option], node_value]
                         elif node_value > optimal_placement[1]:
-                            optimal_placement = [possible_actions[rotation][option][0], node_value]
+                            optimal_placement = [possible_actions[rotation][option], node_value]
+            coordinate_tag, chosen_board = optimal_placement[0]
                             #rotation                #height                    #column - left trimmed
-            placement = [optimal_placement[0][0], optimal_placement[0][2], optimal_placement[0][1] - optimal_placement[0][3]]
+            placement = [coordinate_tag[0], coordinate_tag[2], coordinate_tag[1] - coordinate_tag[3]]
             
             #Checks if top two columns are filled by the chosen placement
-            for option in range(0, len(possible_actions[placement[0]])):
-                if(possible_actions[placement[0]][option][0][1] == placement[2]):
-                    chosen_board = possible_actions[placement[0]][option][1]
-                    if chosen_board.skyline_occuppied() == True:
-                        print("Game Over: Option chosen where skyline occupied")
-                        #Remember previous state and action
-                        self.previous_state = self.__format_previous_state()
-                        self.previous_action = copy.deepcopy(placement)
-                        return False
-                    else:
-                        break
+            if chosen_board.skyline_occuppied() == True:
+                logger.debug("Game Over: Option chosen where skyline occupied")
+                #Remember previous state and action
+                self.previous_state = self.__format_previous_state()
+                self.previous_action = self.action_node(coordinate_tag)
+                return False
+            self.previous_action = self.action_node(coordinate_tag)
                         
         else:
             placement = self.choose_random_tetromino_placement()
         
-        #Remember previous state and action
+        #Remember previous state
         self.previous_state = self.__format_previous_state()
-        if placement != False:
-            self.previous_action = copy.deepcopy(placement)
         return placement
     
     def query(self, state, current_net=True):
@@ -532,18 +602,25 @@ class agent():
         Returns a predicted value for a state-action pair.
         If current_net is true then the current_net is used for this prediction.
         If current_net is false then the target_net is used for this prediction.
+        The prediction is made by the NumPy copy of the network.
         """
         if(current_net == True):
-            value_prediction = self.current_net.predict(state, batch_size=1)
+            value_prediction = self.current_forward.predict(state)
         else:
-            value_prediction = self.target_net.predict(state, batch_size=1)
+            value_prediction = self.target_forward.predict(state)
         return value_prediction
     
     def find_valid_placements(self, agent_tetromino=None, board=None):
         """
         Searches the board for valid placements
         Searches the top of each column on the board for valid placement.
+        The placements of the agent's own tetromino on the current board are worked out once per turn
+        and kept until set_current_board or set_agent_tetromino is called.
         """
+        if agent_tetromino is None and board is None:
+            if self.valid_placements is None:
+                self.valid_placements = self.find_valid_placements(self.agent_tetromino, self.current_board)
+            return self.valid_placements
         if(agent_tetromino==None):
             agent_tetromino = self.agent_tetromino
         if(board==None):
@@ -562,75 +639,38 @@ class agent():
         """
         Searches the board for valid placements for a rotation of a tetromino
         This is performed 4 times. Once for each tetromino.
+
+        The tetromino is dropped straight down in every column: the row it lands on is found from the
+        column heights and the number of empty cells under each column of the trimmed tetromino.
+        A placement is valid if the whole tetromino is inside the board where it lands.
+        Each placement is [[rotation, column, row of the bottom of the tetromino, left columns trimmed], afterstate].
         """
-        
         column_heights = board.column_heights
-        tetromino, left_trimmed = self.trim_tetromino(agent_tetromino,rotation)
-        #Need to trim None values and find empty column get a more realistic shape of the tetromino
+        rows = len(board.board_representation)
+        rotation_geometry = geometry(agent_tetromino[rotation])
+        tetromino = rotation_geometry.trimmed
+        bottoms = rotation_geometry.trimmed_bottoms
         tetromino_width = len(tetromino[0])
-        tetromino_height = len(tetromino) - 1 
-                
-        #Calculate rows below full cell
-        
-        #Check column height and for each column
+        tetromino_height = len(tetromino) - 1
+        cells = [(y - tetromino_height, x) for y in range(tetromino_height + 1) for x in range(tetromino_width) if tetromino[y][x]]
+
         valid_placements = []
         for column in range(len(column_heights)-(tetromino_width-1)): #For each column
-            test_board = copy.deepcopy(board) #Create copy of board
-            placeable_height = 21 - column_heights[column] #For the current column, what height can the tetromino be placed at
-            for tet_height in range(tetromino_height + 1): #for each row in the tetromino
-                for tet_width in range(tetromino_width): #for each column in tetromino
-                                                    #moves up the placeable row   #the x-axis to place the tetromino
-                                                      
-                    test_board.board_representation[placeable_height - tet_height][column+tet_width] = test_board.board_representation[placeable_height - tet_height][column+tet_width] + tetromino[tetromino_height - tet_height][tet_width]
-            
-            #Checks if the current position being tested allows for valid placement
-            can_place = True
-            for check_row in range(len(test_board.board_representation)):
-                for check_column in range(len(test_board.board_representation[check_row])):
-                    if test_board.board_representation[check_row][check_column] != 1 and test_board.board_representation[check_row][check_column] != 0:
-                        can_place = False
-                        break
-                if can_place == False:
-                    break
-            #Creates a list with data relating to placement
-            if can_place == True:
-                    coordinate_tag = []
-                    coordinate_tag.append(rotation)
-                    coordinate_tag.append(column)
-                    coordinate_tag.append(placeable_height)
-                    coordinate_tag.append(left_trimmed)
-                    placeable_position = []
-                    placeable_position.append(coordinate_tag)
-                    placeable_position.append(test_board)
-                    valid_placements.append(placeable_position)
+            #Lowest row the bottom of the tetromino can reach before one of its columns meets the stack
+            placeable_height = min(rows - 1 - column_heights[column + x] + bottoms[x] for x in range(tetromino_width))
+            if placeable_height - tetromino_height >= 0:
+                coordinate_tag = [rotation, column, placeable_height, rotation_geometry.left_trimmed]
+                placed_cells = [(placeable_height + y, column + x) for y, x in cells]
+                valid_placements.append([coordinate_tag, afterstate(board, placed_cells)])
         return valid_placements
         
-    def calculate_tetromino_width(self, agent_tetromino, rotation):
-        """
-        Calculates the width of the current tetromino.
-        Finds out how many cells on the X axis are actually filled.
-        """
-        potential_width = len(agent_tetromino[rotation][0]) #number of columns
-        full_columns = [None]*potential_width
-        for x in range(len(agent_tetromino[rotation])): #for each row
-            for y in range(len(agent_tetromino[rotation][0])):
-                if agent_tetromino[rotation][x][y] == 1:
-                    full_columns[y] = 1
-        return full_columns
-            
-    def calculate_tetromino_height(self, agent_tetromino, rotation):
-        """
-        Calculates the width of the current tetromino.
-        Finds out how many cells on the Y axis are actually filled.
-        """
-        potential_height = len(agent_tetromino[rotation])
-        full_rows = [None]*potential_height
-        for x in range(len(agent_tetromino[rotation])):
-            for y in range(len(agent_tetromino[rotation][0])):
-                if agent_tetromino[rotation][y][x] == 1:
-                    full_rows[y] = 1
-        return full_rows
-    
+    def action_node(self, coordinate_tag):
+        """
+        Returns the ANN output for a placement from find_valid_placements: rotation*10 + column,
+        where column is the leftmost column the trimmed tetromino fills.
+        """
+        return (coordinate_tag[0]*10) + coordinate_tag[1]
+
     def get_current_episode(self):
         """
         Returns the current episode of the agent
@@ -643,11 +683,12 @@ class agent():
         """
         return self.number_of_episodes
     
-    def complete_episode(self):
+    def complete_episode(self, score=None, pieces=0):
         """
-        Writes the results of the current episode, increases the current episode by 1 and decays epsilon
+        Writes the results of the current episode, increases the current episode by 1 and decays epsilon.
+        `score` is the score of the game, the agent's own score if not given, and `pieces` the number of tetrominoes placed.
         """
-        self.write_results_to_csv()
+        self.write_results_to_csv(self.score if score is None else score, pieces)
         self.current_episode = self.current_episode + 1
         self.score = 0
         self.decay_epsilon()
@@ -658,90 +699,92 @@ class agent():
             if self.epsilon < self.epsilon_minimum:
                 self.epsilon = self.epsilon_minimum
     
-    def write_results_to_csv(self):
+    def write_results_to_csv(self, score=0, pieces=0):
+        """
+        Called at the end of an episode, this records the episode number, number of lines cleared, score,
+        tetrominoes placed, epsilon, seconds taken and tetrominoes placed per second in the results csv.
+        Records are buffered and written by `self.results` in batches.
+        """
+        now = time.time()
+        wall_time = now - self.episode_start
+        self.episode_start = now
+        steps_per_second = pieces / wall_time if wall_time > 0 else 0
+        self.results.write([self.current_episode, self.lines_cleared, score, pieces,
+                            "{:.6g}".format(self.epsilon), "{:.3f}".format(wall_time), "{:.2f}".format(steps_per_second)])
+
+    def flush_results(self):
+        """
+        Writes every buffered result to the results csv, and the replay memory to its file if it has one
         """
-        Called at the end of an episode, this appends the episode number and 
-        number of lines cleared to the file results.csv
+        self.results.flush()
+        self.event_memory.flush()
+
+    def close_results(self):
         """
-        episode_results = [str(self.current_episode),str(self.lines_cleared)]
-        with open(self.file_path + str(".csv"), 'a') as results:
-            writer = csv.writer(results)
-            writer.writerow(episode_results)
-            results.close()
+        Writes every buffered result and stops the results writer being flushed at exit, once the run has finished
+        """
+        self.flush_results()
+        self.results.close()
     
+    def checkpoint_state(self):
+        """
+        Returns everything the rest of the run depends on: the weights of both networks, the replay memory,
+        epsilon, the step and episode counters, the state of the agent's random generator and the results so far.
+        Buffered results are written first so the results file holds every episode played.
+        """
+        self.flush_results()
+        with open(self.file_path + str(".csv"), 'rb') as results_file:
+            results = results_file.read()
+        return {"file_path": self.file_path,
+                "results": results,
+                "current_weights": None if self.current_net is None else self.current_net.get_weights(),
+                "target_weights": None if self.target_forward is None else self.target_forward.get_weights(),
+                "event_memory": self.event_memory,
+                "epsilon": self.epsilon,
+                "steps_taken": self.steps_taken,
+                "current_episode": self.current_episode,
+                "lines_cleared": self.lines_cleared,
+                "score": self.score,
+                "rand": self.rand.getstate()}
+
+    def restore_state(self, state):
+        """
+        Restores a state returned by `checkpoint_state`, and the results file as it was when the state was taken
+        """
+        self.file_path = state["file_path"]
+        write_atomic(self.file_path + str(".csv"), state["results"])
+        self.results.close()
+        self.results = ResultsWriter(self.file_path + str(".csv"))
+        self.episode_start = time.time()
+        if state["current_weights"] is not None:
+            self.current_net.set_weights(state["current_weights"])
+            self.current_forward.sync(self.current_net)
+            self.target_net.set_weights(state["target_weights"])
+            self.target_forward.set_weights(state["target_weights"])
+        self.event_memory = state["event_memory"]
+        self.epsilon = state["epsilon"]
+        self.steps_taken = state["steps_taken"]
+        self.current_episode = state["current_episode"]
+        self.lines_cleared = state["lines_cleared"]
+        self.score = state["score"]
+        self.rand.setstate(state["rand"])
+
     def load_new_seed(self):
         """
         Loads the seed for the corresponding episode
-        Takes the seed from seeds.csv which may be generated by the generate_seeds.py module
+        Takes the seed from the agent's SeedStore, which seeds.py generates. Returns None if there is no seed for the episode.
         """
-        with open('seeds.csv', 'r') as seed_csv:
-            seed_reader = csv.reader(seed_csv, delimiter=',', quotechar='|')
-            for seed in seed_reader:
-                if int(seed[0]) == self.current_episode:
-                    return seed[1]
+        return self.seeds.seed(self.current_episode)
     
     def trim_tetromino(self,tetromino, rotation):
         """
         Removes empty rows and columns from a tetromino with a specific rotation
         Returns both the number of left columns trimmed and the trimmed tetromino
         The number of left columns trimmed is used in additional calculations as to where the tetromino should be placed.
+        Both are looked up in the table in pieces.py.
         """
-        trimmed_tetromino = copy.deepcopy(tetromino[rotation])
-        tetromino_matrix_height = len(trimmed_tetromino)
-
-        trimming_left = True
-        trimming_right = False
-        left_columns_trimmed = 0
-        right_columns_trimmed = 0
-        columns_trimmed = 0
-        loop_without_trim = False
-        
-        #Trim empty columns
-        while loop_without_trim == False:
-            """
-            Loops through rows within columns and lists cell values within each column.
-            If a column is "empty" i.e. full of 0s then the cell is removed and the loop process is restarted.
-            This continues until the tetromino is looped through without trimming
-            """
-            loop_without_trim = True
-            for x in range(len(trimmed_tetromino[0])):
-    
-                column = []
-                for y in range(tetromino_matrix_height):
-                    column.append(trimmed_tetromino[y][x])
-                if 1 not in column:
-                    loop_without_trim = False
-                    columns_trimmed = columns_trimmed + 1
-                    if trimming_left == True:
-                        left_columns_trimmed = left_columns_trimmed + 1
-                    else:
-                        right_columns_trimmed = right_columns_trimmed + 1
-                    for y in range(tetromino_matrix_height):
-                        trimmed_tetromino[y].pop(x)
-                    break
-                if 1 in column and trimming_left == True and trimming_right == False:
-                    trimming_left = False
-                    trimming_right = False
-        
-        #Trim empty rows
-        loop_without_trim = False
-        while loop_without_trim == False:
-                """
-                Loops through cells within row and lists cell values within each row.
-                If a row is "empty" i.e. full of 0s then the cell is removed and the loop process is restarted.
-                This continues until the tetromino is looped through without trimming
-                """
-                loop_without_trim = True
-                for x in range(len(trimmed_tetromino)):
-                    row = []
-                    for y in range(len(trimmed_tetromino[0])):
-                        row.append(trimmed_tetromino[x][y])
-                    if 1 not in row:
-                        loop_without_trim = False 
-                        trimmed_tetromino.pop(x)
-                        break
-        
-        return trimmed_tetromino, left_columns_trimmed
+        rotation_geometry = geometry(tetromino[rotation])
+        return rotation_geometry.trimmed, rotation_geometry.left_trimmed
     
     def update_score(self, score):
         """
@@ -774,7 +817,6 @@ class agent():
                 reward = (reward ** 2) - punishment
             else:
                 reward = (reward ** 2) 
-            print("Reward: " + str(reward))
             return reward
         else:
             reward = self.update_score(score)
@@ -786,11 +828,25 @@ class agent():
         """
         Remembers as SARS - State --> Action --> Reward --> State
         This stores the additional information of whether or not a state was terminal.
-        
+        The action is the ANN output of the move, as given by action_node.
+        The new board is remembered as its ANN inputs and the valid actions of each tetromino on it,
+        worked out once here rather than every time the event is replayed.
+        Once memory_size events are remembered each new event replaces the oldest.
+        """
+        next_board_inputs, next_valid = self.encode_next_state(new_board)
+        self.event_memory.append(previous_state, previous_action, reward, next_board_inputs, next_valid, terminal_state)
+
+    def encode_next_state(self, board):
         """
-        self.event_memory.append([previous_state, previous_action, reward, copy.deepcopy(new_board), terminal_state])
-        if len(self.event_memory) > self.memory_size:
-            self.event_memory.pop(0)
+        Returns the ANN inputs that describe a board, without the tetromino,
+        and a (tetrominoes, 40) mask of the actions that are valid for each tetromino on it.
+        """
+        board_inputs = list(board.column_differences)
+        if self.holes == True:
+            board_inputs.append(board.get_holes())
+        if self.height == True:
+            board_inputs.append(board.get_board_height())
+        return board_inputs, valid_action_masks([board.column_heights])[0]
     
     def update_approximater(self):
         """
@@ -799,170 +855,67 @@ class agent():
             reward from the state (if terminal state)
             Max predicted reward from next state (if non-terminal state)
         Gradient descent is then performed on the current_net
+
+        The whole sample is handled as arrays: the next state of every memory with each of the tetrominoes
+        is evaluated by the target_net at once, and current_net is fitted once on the sample.
         """
         if self.supervised == False:
-            if len(self.event_memory) < self.sample_size:
-                memory_samples = random.sample(self.event_memory, len(self.event_memory))
-            else:
-                memory_samples = random.sample(self.event_memory, self.sample_size)
-                
-            for memory in memory_samples:
-                previous_state = memory[0]
-                action = memory[1]
-                reward = memory[2]
-                next_state = memory[3]
-                terminal_state = memory[4]
-                
-                if terminal_state == True:
-                    #Terminal state, so target is just the received reward / punishment
-                    target = np.array([reward])
-                else:
-                    """
-                    From the next_state:
-                    For each possible next tetromino
-                        Calculate the next possible actions
-                        Choose the Maximum Possible Reward
-                    Pick the Maximum from the maximums, set to SAMAX
-                    Perform: target = Reward + (GAMMA * SAMAX)
-                    """
-                    column_differences = next_state.column_differences
-                    holes = next_state.get_holes()
-                    height = next_state.get_board_height()
-                    maximum_values = []
-                    tetrominos = list_of_tetrominoes
-                    for tetromino_shape in tetrominos:
-                        tetromino = self.convert_tetromino(tetromino_shape)
-                        #Loads a standard 4*2 tetromino input
-                        tetromino_input = self.tetromino_to_input(tetromino)
-                                           
-                        if self.holes == False and self.height == False:
-                            next_state_inputs = np.array([[
-                                #Tetromino being used
-                                tetromino_input[0][0],tetromino_input[0][1],tetromino_input[0][2],tetromino_input[0][3],
-                                tetromino_input[1][0],tetromino_input[1][1],tetromino_input[1][2],tetromino_input[1][3],
-                                #State of next board (differences in column height)
-                                column_differences[0],column_differences[1],
-                                column_differences[2],column_differences[3],
-                                column_differences[4],column_differences[5],
-                                column_differences[6],column_differences[7],
-                                column_differences[8],column_differences[9],                        
-                            ]])
-                        elif (self.holes == True and self.height == False):
-                            next_state_inputs = np.array([[
-                                #Tetromino being used
-                                tetromino_input[0][0],tetromino_input[0][1],tetromino_input[0][2],tetromino_input[0][3],
-                                tetromino_input[1][0],tetromino_input[1][1],tetromino_input[1][2],tetromino_input[1][3],
-                                #State of next board (differences in column height and number of holes)
-                                column_differences[0],column_differences[1],
-                                column_differences[2],column_differences[3],
-                                column_differences[4],column_differences[5],
-                                column_differences[6],column_differences[7],
-                                column_differences[8],column_differences[9],
-                                holes                 
-                            ]])
-                        elif (self.holes == False and self.height == True):
-                            next_state_inputs = np.array([[
-                                #Tetromino being used
-                                tetromino_input[0][0],tetromino_input[0][1],tetromino_input[0][2],tetromino_input[0][3],
-                                tetromino_input[1][0],tetromino_input[1][1],tetromino_input[1][2],tetromino_input[1][3],
-                                #State of next board (differences in column height and maximum height)
-                                column_differences[0],column_differences[1],
-                                column_differences[2],column_differences[3],
-                                column_differences[4],column_differences[5],
-                                column_differences[6],column_differences[7],
-                                column_differences[8],column_differences[9],
-                                height               
-                            ]])
-                        
-                        elif self.holes == True and self.height == True:
-                            next_state_inputs = np.array([[
-                                #Tetromino being used
-                                tetromino_input[0][0],tetromino_input[0][1],tetromino_input[0][2],tetromino_input[0][3],
-                                tetromino_input[1][0],tetromino_input[1][1],tetromino_input[1][2],tetromino_input[1][3],
-                                #State of next board (differences in column height, holes and maximum height)
-                                self.current_board.column_differences[0],self.current_board.column_differences[1],
-                                self.current_board.column_differences[2],self.current_board.column_differences[3],
-                                self.current_board.column_differences[4],self.current_board.column_differences[5],
-                                self.current_board.column_differences[6],self.current_board.column_differences[7],
-                                self.current_board.column_differences[8],self.current_board.column_differences[9],
-                                holes, height    
-                            ]])
-    
-                        #Stores the 4 possible rotations for the tetromino
-                        tetromino_rotations = []
-                        tetromino_rotations.append(tetromino)
-                        for x in range (0,3):
-                            tetromino_rotations.append(self.rotate_agent_tetromino(tetromino_rotations[x]))
-                        #queries ANN
-                        query_output = self.query(next_state_inputs, False)
-                       
-                        #retrieves values of valid placements and takes the maximum
-                        valid_placements = self.find_valid_placements(tetromino_rotations, next_state)
-                        tetromino_values = []
-                        for valid_rotation in valid_placements:
-                            for placement in valid_rotation:
-                                rotation = placement[0][0]
-                                column = placement[0][1]
-                                output_node = (rotation*10) + column #output node to retrieve the predicted value from.
-                                node_value = query_output[0][output_node]
-                                tetromino_values.append([node_value, output_node])
-                        maximum_value = None
-                        for value in tetromino_values:
-                            if value is not None:
-                                if maximum_value == None:
-                                    maximum_value = value
-                                elif maximum_value[0] < value[0]:
-                                    maximum_value = value
-                        maximum_values.append(maximum_value)
-                    
-                    maximum_value = None
-                    for value in maximum_values:
-                        try:
-                            #Fixes issue where maximum_values may contain None.
-                            #Resolved by ignoring None value
-                            if value is not None:
-                                if maximum_value == None:
-                                    maximum_value = value
-                                elif maximum_value[0] < value[0]:
-                                    maximum_value = value
-                        except:
-                            print("None value in approximator. Value ignored!")
-                    
-                    if maximum_value == None:
-                        #Handles rare, but not impossible state of no valid moves.
-                        print("Maximum value set to None. Resetting to [0,0]")
-                        maximum_value = [0,0]
-                    target = reward + (self.discount * maximum_value[0])
-                    
-                previous_state_input = np.array([previous_state])
-                original_prediction = self.target_net.predict(np.array(previous_state_input))
-                target_array = []
-                action_node = (action[0]*10) + action[2] #output node to retrieve the predicted value from.
-                for x in range (0,40):
-                    if action_node == x:
-                        target_array.append(target)
-                    else:
-                        target_array.append(original_prediction[0,x])
-                net_target = np.array([target_array])
-                self.current_net.fit(previous_state_input, net_target,verbose=0)
-            
+            if len(self.event_memory) == 0:
+                return
+            previous_states, actions, rewards, next_state_inputs, valid_actions, terminal_states = self.event_memory.sample(self.sample_size)
+            sample_size = len(actions)
+
+            """
+            From each next_state:
+            For each possible next tetromino
+                Calculate the next possible actions
+                Choose the Maximum Possible Reward
+            Pick the Maximum from the maximums, set to SAMAX
+            Perform: target = Reward + (GAMMA * SAMAX)
+            """
+            number_of_tetrominoes = next_state_inputs.shape[1]
+            query_output = self.query(next_state_inputs.reshape(sample_size * number_of_tetrominoes, -1), False)
+            query_output = query_output.reshape(valid_actions.shape)
+            maximum_values = np.where(valid_actions, query_output, -np.inf).max(axis=(1, 2))
+            #Handles rare, but not impossible state of no valid moves.
+            maximum_values[~valid_actions.any(axis=(1, 2))] = 0
+
+            #Terminal state, so target is just the received reward / punishment
+            targets = np.where(terminal_states, rewards, rewards + (self.discount * maximum_values))
+
+            #Only the output of the action taken is moved towards its target
+            net_targets = np.array(self.query(previous_states, False))
+            net_targets[np.arange(sample_size), actions] = targets
+            self.current_net.fit(previous_states, net_targets, batch_size=sample_size, verbose=0)
+            self.current_forward.sync(self.current_net)
+
     def reset_approximaters(self):
         """
-        Sets the target_net to the current_net every fixed amount of steps
+        Sets the target_net to the current_net every fixed amount of steps.
+        If target_tau is set the target_net is instead moved a fraction target_tau of the way towards the current_net every step.
+        """
+        if self.target_tau is not None:
+            self.sync_target(self.target_tau)
+        elif self.steps_taken % self.reset_steps == 0:
+            self.sync_target()
+
+    def sync_target(self, tau=1):
         """
-        if self.steps_taken % self.reset_steps == 0:
-            self.target_net = copy.deepcopy(self.current_net)
+        Copies the weights of the current_net into the target_net and its NumPy copy, target_forward.
+        With tau below 1 each target weight becomes tau * current weight + (1 - tau) * target weight.
+        """
+        weights = self.current_net.get_weights()
+        if tau != 1:
+            weights = [(tau * current) + ((1 - tau) * target) for current, target in zip(weights, self.target_forward.get_weights())]
+        self.target_net.set_weights(weights)
+        self.target_forward.set_weights(weights)
     
     def tetromino_to_input(self, tetromino):
         """
         Converts the agent's tetromino to an input acceptable for the ANN
         """
-        tetromino_input = [[0,0,0,0], [0,0,0,0]]
-        for input_height in range(0, len(tetromino_input)):
-        #Fills the tetromino_input; used as part of the ANN input
-            for tetromino_width in range (0, len(tetromino[0])):
-                tetromino_input[input_height][tetromino_width] = tetromino[input_height][tetromino_width]
-        return tetromino_input
+        encoding = geometry(tetromino).encoding
+        return [list(encoding[:4]), list(encoding[4:])]
     
     def __format_previous_state(self):
         """
@@ -1024,3 +977,271 @@ class agent():
                 holes, height]
         return previous_state
                 
+
+
+def test():
+    import os
+    import tempfile
+    from seeds import SeedStore, generate_seeds
+    from tetrominoes import list_of_tetrominoes
+
+    def make_board(rows):
+        new_board = board([[int(cell) for cell in row] for row in rows])
+        new_board.set_features()
+        return new_board
+
+    def features_of(feature_board):
+        return (feature_board.column_heights, feature_board.holes_per_column, feature_board.column_differences,
+                feature_board.board_height, feature_board.cum_height, feature_board.height_difference_punishment)
+
+    def lock(locked_board, cells):
+        placed = [list(row) for row in locked_board.board_representation]
+        for y, x in cells:
+            placed[y][x] = 1
+        locked_board.update_features(cells, [y for y in range(len(placed)) if all(placed[y])])
+
+    def check_lock(rows, cells, expected_rows):
+        locked_board = make_board(rows)
+        lock(locked_board, cells)
+        expected = make_board(expected_rows)
+        assert locked_board.board_representation == expected.board_representation
+        assert features_of(locked_board) == features_of(expected)
+
+    #A lock that clears no lines
+    check_lock(["00000", "00000", "00000", "00000", "10000", "11001"],
+               [(2, 2), (3, 2), (4, 2), (5, 2)],
+               ["00000", "00000", "00100", "00100", "10100", "11101"])
+    #A lock that clears lines
+    check_lock(["00000", "00000", "00000", "00000", "11101", "11101"],
+               [(2, 3), (3, 3), (4, 3), (5, 3)],
+               ["00000", "00000", "00000", "00000", "00010", "00010"])
+    #A lock that leaves holes under an overhang
+    check_lock(["00000", "00000", "00000", "00000", "10000", "11000"],
+               [(3, 1), (4, 1), (4, 2), (4, 3)],
+               ["00000", "00000", "00000", "01000", "11110", "11000"])
+    #Clearing the row a column's top cell was in, with a hole under it
+    check_lock(["00000", "00000", "00000", "00000", "11110", "10100"],
+               [(1, 4), (2, 4), (3, 4), (4, 4)],
+               ["00000", "00000", "00001", "00001", "00001", "10100"])
+    #Clearing the top row of the board
+    check_lock(["01111", "01111", "01111", "01111", "10110", "11101"],
+               [(0, 0), (1, 0), (2, 0), (3, 0)],
+               ["00000", "00000", "00000", "00000", "10110", "11101"])
+
+    #Every lock of random games matches a full rescan of the board
+    results_path = os.path.join(tempfile.mkdtemp(), "results")
+    test_agent = agent([], results_path=results_path, seeds=SeedStore(generate_seeds(1, master_seed=1)))
+    rand = random.Random(0)
+    game_board = make_board(["0" * 10] * 22)
+    lines = 0
+    for _ in range(2000):
+        test_agent.set_agent_tetromino(rand.choice(list_of_tetrominoes))
+        test_agent.set_current_board(game_board)
+        placements = [placement for rotation in test_agent.find_valid_placements() for placement in rotation]
+        placements = [placement for placement in placements if not placement[1].skyline_occuppied()]
+        if not placements:
+            game_board = make_board(["0" * 10] * 22)
+            continue
+        #Low placements clear lines more often
+        lowest = max(placement[0][2] for placement in placements)
+        coordinate_tag, chosen = rand.choice([placement for placement in placements if placement[0][2] >= lowest - 1])
+        height = game_board.get_cum_height()
+        lock(game_board, chosen.cells)
+        lines += game_board.get_cum_height() < height + 4
+        assert features_of(game_board) == features_of(make_board(game_board.board_representation))
+    assert lines > 50
+
+    def dropped_placements(tetromino, rotation, placement_board):
+        #The tetromino enters at the top of each column and moves down a row at a time until it collides
+        rows = placement_board.board_representation
+        rotation_geometry = geometry(tetromino[rotation])
+        trimmed = rotation_geometry.trimmed
+        cells = [(y, x) for y in range(len(trimmed)) for x in range(len(trimmed[0])) if trimmed[y][x]]
+
+        def fits(top, left):
+            return all(top + y < len(rows) and rows[top + y][left + x] == 0 for y, x in cells)
+
+        placements = []
+        for column in range(len(rows[0]) - len(trimmed[0]) + 1):
+            if not fits(0, column):
+                continue
+            top = 0
+            while fits(top + 1, column):
+                top = top + 1
+            placements.append(([rotation, column, top + len(trimmed) - 1, rotation_geometry.left_trimmed],
+                               sorted((top + y, column + x) for y, x in cells)))
+        return placements
+
+    def check_placements(placement_board):
+        for tetromino in list_of_tetrominoes:
+            test_agent.set_agent_tetromino(tetromino)
+            test_agent.set_current_board(placement_board)
+            for rotation, placements in enumerate(test_agent.find_valid_placements()):
+                assert [(coordinate_tag, sorted(after.cells)) for coordinate_tag, after in placements] == \
+                    dropped_placements(test_agent.agent_tetromino, rotation, placement_board)
+                for coordinate_tag, after in placements:
+                    expected = [list(row) for row in placement_board.board_representation]
+                    for y, x in after.cells:
+                        expected[y][x] = 1
+                    assert after.get_board().board_representation == expected
+
+    #Placements match a drop that collides with every cell, not only the tops of the columns, under overhangs
+    overhangs = make_board(["0000000000"] * 14 + ["0000000000", "0111000000", "0100001110", "0100001000",
+                                                  "0000001011", "1100101011", "1100111011", "1101111111"])
+    assert overhangs.get_holes() > 10
+    check_placements(overhangs)
+    #Boards with tall stacks and holes everywhere, where some tetrominoes no longer fit
+    for _ in range(20):
+        full_rows = rand.randint(10, 21)
+        check_placements(make_board(["0" * 10] * (22 - full_rows) +
+                                    ["".join(rand.choice("0111") for _ in range(10)) for _ in range(full_rows)]))
+
+    #The placements of a turn are worked out once, and again once the tetromino has locked
+    import core
+    import scores
+    scores.scorefile = os.path.join(tempfile.mkdtemp(), ".highscores")
+    game_agent = agent([], 1, results_path=os.path.join(tempfile.mkdtemp(), "results"), seeds=SeedStore(generate_seeds(1, master_seed=2)))
+    game = core.MatrisCore(game_agent)
+    turn_placements = game_agent.find_valid_placements()
+    assert game_agent.find_valid_placements() is turn_placements
+    coordinate_tag, after = turn_placements[1][0]
+    game.apply_placement(coordinate_tag[0], coordinate_tag[1] - coordinate_tag[3])
+    assert game.pieces_placed == 1
+    next_placements = game_agent.find_valid_placements()
+    assert next_placements is not turn_placements
+    fresh = game_agent.find_valid_placements(game_agent.agent_tetromino, game_agent.current_board)
+    assert [[(tag, sorted(cells.cells)) for tag, cells in rotation] for rotation in next_placements] == \
+        [[(tag, sorted(cells.cells)) for tag, cells in rotation] for rotation in fresh]
+    game_agent.close_results()
+    test_agent.close_results()
+
+    #Networks that are never trained, with weights NumPy copies can use
+    class StubLayer(object):
+        def __init__(self, activation):
+            self.activation = activation
+
+        def get_config(self):
+            return {'activation': self.activation}
+
+    class StubModel(object):
+        def __init__(self, weights):
+            self.layers = [StubLayer('tanh'), StubLayer('linear')]
+            self.weights = weights
+            self.fitted = []
+
+        def get_weights(self):
+            return [np.array(weight) for weight in self.weights]
+
+        def set_weights(self, weights):
+            self.weights = [np.array(weight) for weight in weights]
+
+        def fit(self, states, targets, batch_size=None, verbose=0):
+            self.fitted.append((np.array(states), np.array(targets)))
+
+    weights_rand = np.random.RandomState(0)
+    def stub_weights():
+        return [weights_rand.randn(18, 8), weights_rand.randn(8), weights_rand.randn(8, 40), weights_rand.randn(40)]
+
+    learner = agent([], results_path=os.path.join(tempfile.mkdtemp(), "results"), seeds=SeedStore(generate_seeds(1, master_seed=3)),
+                    discount=0.9, sample_size=12)
+    learner.current_net = StubModel(stub_weights())
+    learner.target_net = StubModel(stub_weights())
+    learner.current_forward = ForwardNet(learner.current_net)
+    learner.target_forward = ForwardNet(learner.target_net)
+
+    #Empty, holed and random boards, and a full one on which no tetromino fits, as terminal and non-terminal events
+    next_boards = [make_board(["0" * 10] * 22), overhangs, make_board(["1" * 10] * 22)]
+    next_boards += [make_board(["0" * 10] * 10 + ["".join(rand.choice("0111") for _ in range(10)) for _ in range(12)]) for _ in range(5)]
+    for event in range(16):
+        learner.remember_state_action(weights_rand.randn(18).tolist(), rand.randint(0, 39), rand.randint(-50, 10),
+                                      next_boards[event % len(next_boards)], event % 3 == 0)
+
+    random.seed(4)
+    learner.update_approximater()
+    fitted_states, fitted_targets = learner.current_net.fitted[-1]
+    random.seed(4)
+    previous_states, actions, rewards, next_state_inputs, valid_actions, terminal_states = learner.event_memory.sample(learner.sample_size)
+    assert len(actions) == 12 and terminal_states.any() and not terminal_states.all()
+    assert not valid_actions[~terminal_states].any(axis=(1, 2)).all()
+
+    #The targets of the whole sample match working out one memory and one tetromino at a time
+    expected_targets = []
+    for sample in range(len(actions)):
+        targets = learner.query(previous_states[sample:sample + 1], False)[0]
+        if terminal_states[sample]:
+            targets[actions[sample]] = rewards[sample]
+        else:
+            maximum_value = None
+            for tetromino in range(len(next_state_inputs[sample])):
+                values = learner.query(next_state_inputs[sample][tetromino:tetromino + 1], False)[0]
+                for action in range(len(values)):
+                    if valid_actions[sample][tetromino][action] and (maximum_value is None or values[action] > maximum_value):
+                        maximum_value = values[action]
+            targets[actions[sample]] = rewards[sample] + learner.discount * (0 if maximum_value is None else maximum_value)
+        expected_targets.append(targets)
+    assert np.array_equal(fitted_states, previous_states)
+    assert np.allclose(fitted_targets, expected_targets)
+    #Terminal memories are moved to their reward alone
+    assert np.array_equal(fitted_targets[terminal_states, actions[terminal_states]], rewards[terminal_states])
+
+    #With tau below 1 the target weights move that fraction of the way to the current weights
+    current_weights = learner.current_net.get_weights()
+    target_weights = learner.target_net.get_weights()
+    learner.sync_target(0.25)
+    for weights in (learner.target_net.get_weights(), learner.target_forward.get_weights()):
+        for weight, current, target in zip(weights, current_weights, target_weights):
+            assert np.allclose(weight, 0.25 * current + 0.75 * target)
+    states = weights_rand.randn(5, 18)
+    assert np.allclose(learner.query(states, False), ForwardNet(learner.target_net).predict(states))
+    #With tau of 1 they are copied
+    learner.sync_target()
+    for weights in (learner.target_net.get_weights(), learner.target_forward.get_weights()):
+        assert all(np.array_equal(weight, current) for weight, current in zip(weights, current_weights))
+    assert np.allclose(learner.query(states, False), learner.query(states))
+
+    #Without target_tau the target_net is only copied every reset_steps steps
+    learner.target_net.set_weights(target_weights)
+    learner.target_forward.set_weights(target_weights)
+    learner.reset_steps = 10
+    learner.steps_taken = 9
+    learner.reset_approximaters()
+    assert np.array_equal(learner.target_forward.get_weights()[0], target_weights[0])
+    learner.steps_taken = 10
+    learner.reset_approximaters()
+    assert np.array_equal(learner.target_forward.get_weights()[0], current_weights[0])
+    #With target_tau it moves every step
+    learner.target_forward.set_weights(target_weights)
+    learner.target_tau = 0.5
+    learner.steps_taken = 11
+    learner.reset_approximaters()
+    assert np.allclose(learner.target_forward.get_weights()[0], 0.5 * current_weights[0] + 0.5 * target_weights[0])
+    learner.close_results()
+
+    #A remembered board is encoded as its inputs and the actions of the placements of every tetromino on it
+    encoder = agent([], holes=True, height=True, results_path=os.path.join(tempfile.mkdtemp(), "results"),
+                    seeds=SeedStore(generate_seeds(1, master_seed=4)))
+    for next_board in next_boards:
+        board_inputs, valid = encoder.encode_next_state(next_board)
+        assert board_inputs == next_board.column_differences + [next_board.get_holes(), next_board.get_board_height()]
+        assert valid.shape == (len(list_of_tetrominoes), 40)
+        for tetromino, tetromino_valid in zip(list_of_tetrominoes, valid):
+            encoder.set_agent_tetromino(tetromino)
+            encoder.set_current_board(next_board)
+            actions = set(encoder.action_node(coordinate_tag) for rotation in encoder.find_valid_placements() for coordinate_tag, after in rotation)
+            assert set(np.flatnonzero(tetromino_valid)) == actions
+
+    #The event keeps the board as it was when it was remembered
+    remembered = make_board(["0" * 10] * 20 + ["1100000000", "1110000011"])
+    board_inputs, valid = encoder.encode_next_state(remembered)
+    encoder.remember_state_action([0] * 20, 3, 1, remembered, False)
+    lock(remembered, [(18, 4), (19, 4), (20, 4), (21, 4)])
+    assert remembered.column_heights[4] == 4
+    previous_states, actions, rewards, next_state_inputs, valid_actions, terminal_states = encoder.event_memory.sample(1)
+    assert np.array_equal(next_state_inputs[0], np.hstack([piece_encodings, np.tile(board_inputs, (len(piece_encodings), 1))]))
+    assert np.array_equal(valid_actions[0], valid)
+    encoder.close_results()
+
+    print("All tests passed in {}, things seems to be working alright".format(__file__))
+
+if __name__ == '__main__':
+    test()
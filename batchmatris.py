@@ -0,0 +1,305 @@
+"""
+Plays many games of MaTris in lockstep for training.
+Every board is held in one NumPy array, and a whole batch of agent moves is applied with one call to `step`.
+"""
+from __future__ import print_function
+import random
+
+import numpy as np
+
+from features import board_features
+from pieces import pieces
+
+MATRIX_WIDTH = 10
+MATRIX_HEIGHT = 22
+
+#One action for each rotation and column: action = rotation*10 + column.
+#The column is where the leftmost filled column of the rotated tetromino goes, as in agent.py.
+ACTIONS = 4 * MATRIX_WIDTH
+
+def build_action_table():
+    """
+    Works out, for every tetromino and action, which columns the tetromino covers,
+    how far each of those columns is above the bottom of the tetromino and where its cells are.
+    """
+    shape = (len(pieces), ACTIONS)
+    valid = np.zeros(shape, dtype=bool)
+    columns = np.zeros(shape + (4,), dtype=np.int8)
+    covered = np.zeros(shape + (4,), dtype=bool)
+    bottoms = np.zeros(shape + (4,), dtype=np.int8)
+    heights = np.ones(shape, dtype=np.int8)
+    top_trimmed = np.zeros(shape, dtype=np.intp)
+    cells_y = np.zeros(shape + (4,), dtype=np.intp)
+    cells_x = np.zeros(shape + (4,), dtype=np.intp)
+
+    for p in range(len(pieces)):
+        for r in range(4):
+            rotation = pieces[p].rotations[r]
+            trimmed = rotation.trimmed
+            width = len(trimmed[0])
+            cells = [(y, x) for y in range(len(trimmed)) for x in range(width) if trimmed[y][x]]
+            if len(cells) != 4:
+                raise ValueError("BatchMatris only plays tetrominoes with 4 cells")
+            for column in range(MATRIX_WIDTH - width + 1):
+                action = r * MATRIX_WIDTH + column
+                valid[p, action] = True
+                columns[p, action, :width] = np.arange(column, column + width)
+                covered[p, action, :width] = True
+                bottoms[p, action, :width] = rotation.trimmed_bottoms
+                heights[p, action] = len(trimmed)
+                top_trimmed[p, action] = min(top for x, top in rotation.tops)
+                cells_y[p, action] = [y for y, x in cells]
+                cells_x[p, action] = [column + x for y, x in cells]
+    return valid, columns, covered, bottoms, heights, top_trimmed, cells_y, cells_x
+
+(action_valid, action_columns, action_covered, action_bottoms,
+ action_heights, action_top_trimmed, action_cells_y, action_cells_x) = build_action_table()
+
+#The 8 network inputs that describe each tetromino
+piece_encodings = np.array([piece.rotations[0].encoding for piece in pieces], dtype=float)
+
+def valid_action_masks(column_heights):
+    """
+    Returns a (boards, tetrominoes, 40) mask of the actions that keep each tetromino inside the matrix
+    when it is dropped on boards with the given (boards, 10) column heights
+    """
+    column_heights = np.asarray(column_heights)
+    heights = column_heights[:, action_columns]
+    landing = np.where(action_covered, MATRIX_HEIGHT - 1 - heights + action_bottoms, MATRIX_HEIGHT).min(axis=-1)
+    return action_valid & (landing - action_heights + 1 >= 0)
+
+class BatchMatris(object):
+    """
+    `number_of_games` games of MaTris played in lockstep.
+
+    `boards` is a (games, 22, 10) array of occupied cells. Each game has its own tetromino queue,
+    drawn from a random.Random seeded per game, so a game started with seed s gets the same
+    tetrominoes as a new MatrisCore made after random.seed(s). This only holds for the first game of a MatrisCore:
+    the later games of an agent start with the next tetromino of the game before (see MatrisCore.start_episode).
+
+    The states returned by `reset` and `step` are the inputs of the agent's network, one row per game:
+    the tetromino encoding, the column differences, then the holes and the height if they are used.
+    Finished games are started again straight away, so every row always describes a game in progress.
+    """
+
+    def __init__(self, number_of_games, holes=False, height=False, rewards_as_lines=True, terminal_reward=-1000, seed=None):
+        self.number_of_games = number_of_games
+        self.holes = holes
+        self.height = height
+        self.rewards_as_lines = rewards_as_lines
+        self.terminal_reward = terminal_reward
+        #Seeds of the games started after the first ones finish
+        self.seed_generator = random.Random(seed)
+
+        self.boards = np.zeros((number_of_games, MATRIX_HEIGHT, MATRIX_WIDTH), dtype=bool)
+        self.column_heights = np.zeros((number_of_games, MATRIX_WIDTH), dtype=np.intp)
+        self.current = np.zeros(number_of_games, dtype=np.intp)
+        self.next = np.zeros(number_of_games, dtype=np.intp)
+        self.queues = [None] * number_of_games
+
+        self.score = np.zeros(number_of_games, dtype=np.int64)
+        self.lines = np.zeros(number_of_games, dtype=np.int64)
+        self.level = np.ones(number_of_games, dtype=np.int64)
+        self.combo = np.ones(number_of_games, dtype=np.int64)
+        self.pieces_placed = np.zeros(number_of_games, dtype=np.int64)
+
+    def reset(self, seeds=None):
+        """
+        Starts every game again, with one seed per game if `seeds` is given.
+        Returns the states and valid action masks of the new games.
+        """
+        self.reset_games(np.ones(self.number_of_games, dtype=bool), seeds)
+        return self.states(), self.valid_actions()
+
+    def reset_games(self, games, seeds=None):
+        """
+        Clears the boards of the games selected by the boolean array `games` and deals their first tetrominoes
+        """
+        indices = np.flatnonzero(games)
+        for n in range(len(indices)):
+            i = indices[n]
+            seed = seeds[n] if seeds is not None else self.seed_generator.randrange(2**32)
+            self.queues[i] = random.Random(seed)
+            self.current[i] = self.queues[i].randrange(len(pieces))
+            self.next[i] = self.queues[i].randrange(len(pieces))
+        self.boards[indices] = False
+        self.column_heights[indices] = 0
+        self.score[indices] = 0
+        self.lines[indices] = 0
+        self.level[indices] = 1
+        self.combo[indices] = 1
+        self.pieces_placed[indices] = 0
+
+    def landing_tops(self, current, column_heights, actions=None):
+        """
+        Returns the row the top of each tetromino lands on for each action,
+        found from the column heights and the bottom profile of the tetromino.
+        A negative row means the tetromino does not fit in the matrix.
+        """
+        if actions is None:
+            columns = action_columns[current]
+            covered = action_covered[current]
+            bottoms = action_bottoms[current]
+            tetromino_heights = action_heights[current]
+            rows = np.arange(len(current))[:, None, None]
+        else:
+            columns = action_columns[current, actions]
+            covered = action_covered[current, actions]
+            bottoms = action_bottoms[current, actions]
+            tetromino_heights = action_heights[current, actions]
+            rows = np.arange(len(current))[:, None]
+        heights = column_heights[rows, columns]
+        landing = np.where(covered, MATRIX_HEIGHT - 1 - heights + bottoms, MATRIX_HEIGHT).min(axis=-1)
+        return landing - tetromino_heights + 1
+
+    def valid_actions(self):
+        """
+        Returns a (games, 40) mask of the actions that place the current tetromino inside the matrix
+        """
+        return action_valid[self.current] & (self.landing_tops(self.current, self.column_heights) >= 0)
+
+    def step(self, actions):
+        """
+        Places the current tetromino of every game with `actions`, one action per game.
+        Returns the new states, the rewards, which games finished, the new valid action masks
+        and a dictionary with the lines cleared this step and the lines, score and pieces of the games that finished.
+        Games that finish are started again, so their new state is the start of a new game.
+        """
+        actions = np.asarray(actions, dtype=np.intp)
+        games = np.arange(self.number_of_games)
+        if not action_valid[self.current, actions].all():
+            raise ValueError("Action outside the matrix for the current tetromino")
+
+        tops = self.landing_tops(self.current, self.column_heights, actions)
+        placed = tops >= 0
+
+        #Places the 4 cells of each tetromino
+        cell_rows = tops[:, None] + action_cells_y[self.current, actions]
+        cell_columns = action_cells_x[self.current, actions]
+        self.boards[games[placed, None], cell_rows[placed], cell_columns[placed]] = True
+
+        #Removes full lines by moving them to the top and emptying them
+        full = self.boards.all(axis=2)
+        lines_cleared = full.sum(axis=1)
+        order = np.argsort(~full, axis=1, kind='stable')
+        self.boards = np.take_along_axis(self.boards, order[:, :, None], axis=1)
+        self.boards[np.arange(MATRIX_HEIGHT)[None, :] < lines_cleared[:, None]] = False
+        self.column_heights = self.heights()
+
+        #Scores the same way as MatrisCore.apply_placement and MatrisCore.lock_tetromino
+        previous_score = self.score.copy()
+        self.score += np.where(placed, 10 * (tops - action_top_trimmed[self.current, actions]), 0)
+        self.score += 100 * lines_cleared**2 * self.combo
+        self.lines += lines_cleared
+        level_up = self.lines >= self.level * 10
+        self.combo = np.where(level_up, np.where(lines_cleared > 0, self.combo + 1, 1), self.combo)
+        self.level += level_up
+        self.pieces_placed += placed
+
+        if self.rewards_as_lines:
+            punishment = self.column_heights.max(axis=1) - self.column_heights.min(axis=1)
+            rewards = np.where(lines_cleared > 0, lines_cleared**2, -punishment)
+        else:
+            rewards = self.score - previous_score
+
+        #Deals the next tetromino
+        self.current = self.next.copy()
+        for i in range(self.number_of_games):
+            self.next[i] = self.queues[i].randrange(len(pieces))
+
+        #A game is over if the tetromino did not fit, the skyline is occupied or the next tetromino has nowhere to go
+        skyline_occupied = self.boards[:, :2].any(axis=(1, 2))
+        valid = self.valid_actions()
+        dones = ~placed | skyline_occupied | ~valid.any(axis=1)
+        rewards = np.where(dones, self.terminal_reward, rewards)
+
+        info = {'lines_cleared': lines_cleared,
+                'episode_lines': np.where(dones, self.lines, 0),
+                'episode_score': np.where(dones, self.score, 0),
+                'episode_pieces': np.where(dones, self.pieces_placed, 0)}
+        if dones.any():
+            self.reset_games(dones)
+            valid[dones] = self.valid_actions()[dones]
+        return self.states(), rewards, dones, valid, info
+
+    def heights(self):
+        """
+        Returns the height of every column of every game
+        """
+        occupied = self.boards.any(axis=1)
+        return np.where(occupied, MATRIX_HEIGHT - self.boards.argmax(axis=1), 0)
+
+    def states(self):
+        """
+        Returns the network inputs of every game as a (games, inputs) array
+        """
+        features = board_features(self.boards)
+        inputs = [piece_encodings[self.current], features.column_differences]
+        if self.holes:
+            inputs.append(features.holes[:, None])
+        if self.height:
+            inputs.append(features.max_height[:, None])
+        return np.hstack(inputs).astype(float)
+
+
+def test():
+    import os
+    import tempfile
+    import scores
+    from core import MatrisCore, GameOver
+
+    #Scores of the test games are not kept
+    scores.scorefile = os.path.join(tempfile.mkdtemp(), ".highscores")
+    number_of_games = 8
+    batch = BatchMatris(number_of_games, holes=True, height=True, seed=1)
+    first_seeds = list(range(100, 100 + number_of_games))
+    states, valid = batch.reset(first_seeds)
+    assert states.shape == (number_of_games, 8 + MATRIX_WIDTH + 2)
+    assert (valid == valid_action_masks(batch.column_heights)[np.arange(number_of_games), batch.current]).all()
+
+    #Plays low placements so that lines are cleared, and records every game with the seed it was started with
+    seed_generator = random.Random(1)
+    games = [[seed, []] for seed in first_seeds]
+    playing = list(range(number_of_games))
+    driver = np.random.RandomState(0)
+    lines_cleared = 0
+    for _ in range(300):
+        tops = batch.landing_tops(batch.current, batch.column_heights)
+        actions = np.where(valid, 10 * tops + 5 * driver.rand(*tops.shape), -np.inf).argmax(axis=1)
+        current = batch.current.copy()
+        states, rewards, dones, valid, info = batch.step(actions)
+        lines_cleared += info['lines_cleared'].sum()
+        for i in range(number_of_games):
+            game = games[playing[i]]
+            if dones[i]:
+                game[1].append((current[i], actions[i], None, info['episode_score'][i], info['episode_lines'][i]))
+                #Finished games start again at once with a seed from the seed generator
+                assert not batch.boards[i].any() and batch.score[i] == 0 and batch.lines[i] == 0
+                playing[i] = len(games)
+                games.append([seed_generator.randrange(2**32), []])
+            else:
+                game[1].append((current[i], actions[i], batch.boards[i].copy(), batch.score[i], batch.lines[i]))
+    assert lines_cleared > 100 and len(games) > 2 * number_of_games
+
+    #Every game matches MatrisCore playing the same placements
+    compared = 0
+    for seed, moves in games:
+        random.seed(seed)
+        game = MatrisCore()
+        for piece, action, board, score, lines in moves:
+            assert game.current_tetromino.name == pieces[piece].tetromino.name
+            rotation, column = divmod(action, MATRIX_WIDTH)
+            try:
+                game.apply_placement(rotation, column - pieces[piece].rotations[rotation].left_trimmed)
+            except GameOver:
+                break
+            assert game.score == score and game.lines == lines
+            compared += 1
+            if board is not None:
+                assert (np.array(game.create_board_representation(), dtype=bool) == board).all()
+    assert compared > 2000
+
+    print("All tests passed in {}, things seems to be working alright".format(__file__))
+
+if __name__ == '__main__':
+    test()
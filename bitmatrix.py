@@ -0,0 +1,328 @@
+"""
+Bitboard storage for the MaTris matrix.
+Each row is an integer where bit x is set when column x is occupied.
+"""
+from __future__ import print_function
+
+#Cells of every possible row value as 0 and 1, keyed by matrix width
+row_cells_cache = {}
+
+#Occupied columns of every possible row value, keyed by matrix width
+row_columns_cache = {}
+
+def row_cells(width):
+    """
+    Returns a table that converts a row value into a tuple of 0s and 1s, one per column.
+    """
+    table = row_cells_cache.get(width)
+    if table is None:
+        table = tuple(tuple((row >> x) & 1 for x in range(width)) for row in range(1 << width))
+        row_cells_cache[width] = table
+    return table
+
+def row_columns(width):
+    """
+    Returns a table that converts a row value into a tuple of its occupied columns.
+    """
+    table = row_columns_cache.get(width)
+    if table is None:
+        table = tuple(tuple(x for x in range(width) if (row >> x) & 1) for row in range(1 << width))
+        row_columns_cache[width] = table
+    return table
+
+class BitMatrix(object):
+    """
+    The matrix of a game, stored as one integer per row.
+
+    `rows` records which cells are occupied and is all the game logic needs.
+    `colors` records what is drawn in each cell, exactly as the old dictionary matrix did:
+    None, ('block', block) or ('shadow', block). Shadows are drawn but never occupy a cell.
+    Rows of `colors` are tuples, so copying a matrix only copies two short lists.
+    `heights` holds the height of every column and is kept up to date as cells are placed and rows cleared.
+
+    Cells can still be read and written as `matrix[(y, x)]`.
+    """
+
+    def __init__(self, height, width, rows=None, colors=None, heights=None):
+        self.height = height
+        self.width = width
+        self.full_row = (1 << width) - 1
+        self.rows = [0] * height if rows is None else rows
+        self.colors = [(None,) * width] * height if colors is None else colors
+        self.columns = row_columns(width)
+        if heights is None:
+            heights = [self.column_height(x) for x in range(width)]
+        self.heights = heights
+
+    def copy(self):
+        """
+        Returns an independent copy of the matrix
+        """
+        return BitMatrix(self.height, self.width, list(self.rows), list(self.colors), list(self.heights))
+
+    def column_height(self, x):
+        """
+        Scans column `x` from the top and returns its height; 0 if the column is empty
+        """
+        bit = 1 << x
+        for y in range(self.height):
+            if self.rows[y] & bit:
+                return self.height - y
+        return 0
+
+    def __contains__(self, position):
+        y, x = position
+        return 0 <= y < self.height and 0 <= x < self.width
+
+    def __getitem__(self, position):
+        if position not in self:
+            raise KeyError(position)
+        y, x = position
+        return self.colors[y][x]
+
+    def get(self, position, default=None):
+        """
+        Returns the contents of the cell at `position`, or `default` if it is outside the matrix
+        """
+        if position not in self:
+            return default
+        y, x = position
+        return self.colors[y][x]
+
+    def __setitem__(self, position, value):
+        if position not in self:
+            raise KeyError(position)
+        y, x = position
+        if value and value[0] != 'shadow':
+            self.rows[y] |= 1 << x
+        else:
+            self.rows[y] &= ~(1 << x)
+        self.heights[x] = self.column_height(x)
+        color_row = list(self.colors[y])
+        color_row[x] = value
+        self.colors[y] = tuple(color_row)
+
+    def shifted(self, mask, posX):
+        """
+        Moves a row mask of a shape to column `posX`.
+        Returns None if a filled cell of the shape would be outside the matrix.
+        """
+        if posX >= 0:
+            moved = mask << posX
+            if moved & ~self.full_row:
+                return None
+            return moved
+        if mask & ((1 << -posX) - 1):
+            return None
+        return mask >> -posX
+
+    def in_bounds(self, masks, position):
+        """
+        Checks that every filled cell of a shape at `position` is inside the matrix
+        """
+        posY, posX = position
+        for row in range(len(masks)):
+            if masks[row]:
+                y = posY + row
+                if y < 0 or y >= self.height or self.shifted(masks[row], posX) is None:
+                    return False
+        return True
+
+    def fits(self, masks, position):
+        """
+        Checks that a shape at `position` is inside the matrix and only covers empty cells
+        """
+        posY, posX = position
+        rows = self.rows
+        for row in range(len(masks)):
+            if masks[row]:
+                y = posY + row
+                if y < 0 or y >= self.height:
+                    return False
+                moved = self.shifted(masks[row], posX)
+                if moved is None or rows[y] & moved:
+                    return False
+        return True
+
+    def place(self, masks, position, value):
+        """
+        Writes `value` into every cell covered by a shape at `position`.
+        The shape must already be known to fit.
+        """
+        posY, posX = position
+        occupies = value[0] != 'shadow'
+        for row in range(len(masks)):
+            if masks[row]:
+                y = posY + row
+                moved = self.shifted(masks[row], posX)
+                if occupies:
+                    self.rows[y] |= moved
+                color_row = list(self.colors[y])
+                for x in self.columns[moved]:
+                    color_row[x] = value
+                    if occupies and self.heights[x] < self.height - y:
+                        self.heights[x] = self.height - y
+                self.colors[y] = tuple(color_row)
+
+    def landing_row(self, masks, bottoms, position):
+        """
+        Returns the row a shape at `position` comes to rest on when dropped straight down.
+        `bottoms` holds a (column, lowest filled row) pair for each filled column of the shape.
+
+        The landing row is found from the column heights; only a shape that already sits
+        below the surface of a column, e.g. under an overhang, is moved down row by row.
+        """
+        posY, posX = position
+        if not self.fits(masks, position):
+            return posY
+        landing = min(self.height - self.heights[posX + x] - 1 - bottom for x, bottom in bottoms)
+        if landing < posY:
+            landing = posY
+            while self.fits(masks, (landing + 1, posX)):
+                landing += 1
+        return landing
+
+    def full_rows(self):
+        """
+        Returns the index of every completely filled row
+        """
+        full_row = self.full_row
+        return [y for y in range(self.height) if self.rows[y] == full_row]
+
+    def clear_rows(self, lines):
+        """
+        Removes the rows in `lines` and moves every row above them down
+        """
+        if not lines:
+            return
+        cleared = set(lines)
+        kept = [y for y in range(self.height) if y not in cleared]
+        self.rows = [0] * len(cleared) + [self.rows[y] for y in kept]
+        self.colors = [(None,) * self.width] * len(cleared) + [self.colors[y] for y in kept]
+
+        #A column drops by the number of cleared rows below its top cell, unless that cell was itself cleared
+        for x in range(self.width):
+            if self.heights[x]:
+                top = self.height - self.heights[x]
+                if top in cleared:
+                    self.heights[x] = self.column_height(x)
+                else:
+                    self.heights[x] -= len([y for y in cleared if y > top])
+
+    def representation(self):
+        """
+        Returns the matrix as lists of 0 (empty) and 1 (full), one list per row
+        """
+        cells = row_cells(self.width)
+        return [list(cells[row]) for row in self.rows]
+
+
+def test():
+    import random
+
+    #An L shape in a 3x3 box, with an empty left column: masks are per row, bit x for column x
+    l_masks = (0b100, 0b111, 0)
+    matrix = BitMatrix(6, 4)
+    assert matrix.rows == [0] * 6 and matrix.heights == [0] * 4
+    assert matrix.representation() == [[0, 0, 0, 0]] * 6
+
+    #Shifting a mask moves it right for positive columns and left for negative ones
+    assert matrix.shifted(0b011, 2) == 0b1100
+    assert matrix.shifted(0b011, 3) is None
+    assert matrix.shifted(0b110, -1) == 0b011
+    assert matrix.shifted(0b011, -1) is None
+
+    assert matrix.in_bounds(l_masks, (0, 0))
+    assert matrix.in_bounds(l_masks, (0, 1))
+    assert not matrix.in_bounds(l_masks, (0, 2))
+    assert not matrix.in_bounds(l_masks, (-1, 0))
+    assert not matrix.in_bounds(l_masks, (5, 0))
+    #Empty rows of a shape may hang below the matrix, and an empty left column over its left edge
+    assert matrix.in_bounds(l_masks, (4, 0))
+    assert matrix.in_bounds((0b110, 0b110, 0), (0, -1))
+    assert not matrix.in_bounds((0b111, 0, 0), (0, -1))
+
+    matrix.place(l_masks, (4, 0), ('block', 'orange'))
+    assert matrix.rows == [0, 0, 0, 0, 0b0100, 0b0111]
+    assert matrix.heights == [1, 1, 2, 0]
+    assert matrix[(4, 2)] == ('block', 'orange') and matrix[(4, 1)] is None
+    assert matrix.representation()[4:] == [[0, 0, 1, 0], [1, 1, 1, 0]]
+    assert not matrix.fits(l_masks, (4, 0))
+    assert not matrix.fits(l_masks, (3, 0))
+    assert matrix.fits(l_masks, (2, 0))
+    assert matrix.fits((0b110, 0b110, 0), (3, 2)) is False
+    assert matrix.fits((0b1, 0b1, 0), (4, 3))
+
+    #Shadows are drawn but never occupy a cell
+    shadowed = matrix.copy()
+    shadowed.place((0b1, 0b1, 0), (4, 3), ('shadow', 'blue'))
+    assert shadowed.rows == matrix.rows and shadowed.heights == matrix.heights
+    assert shadowed[(5, 3)] == ('shadow', 'blue') and matrix[(5, 3)] is None
+
+    #A vertical bar at a negative column only fills the last column; it completes the bottom row
+    matrix.place((0b10, 0b10, 0b10), (3, 2), ('block', 'blue'))
+    assert matrix.rows == [0, 0, 0, 0b1000, 0b1100, 0b1111]
+    assert matrix.full_rows() == [5]
+    matrix.clear_rows(matrix.full_rows())
+    assert matrix.rows == [0, 0, 0, 0, 0b1000, 0b1100]
+    assert matrix.representation()[4:] == [[0, 0, 0, 1], [0, 0, 1, 1]]
+    assert matrix[(5, 2)] == ('block', 'orange') and matrix[(5, 3)] == ('block', 'blue')
+    assert matrix.heights == [0, 0, 1, 2]
+    assert matrix.full_rows() == []
+
+    #Landing rows come from the column heights
+    matrix = BitMatrix(6, 4)
+    assert matrix.landing_row(l_masks, ((0, 1), (1, 1), (2, 1)), (0, 1)) == 4
+    matrix.place(l_masks, (4, 1), ('block', 'orange'))
+    assert matrix.heights == [0, 1, 1, 2]
+    assert matrix.landing_row((0b1, 0b1, 0), ((0, 1),), (0, 0)) == 4
+    assert matrix.landing_row((0b1, 0b1, 0), ((0, 1),), (0, 3)) == 2
+    #A shape that does not fit stays where it is
+    assert matrix.landing_row((0b1, 0b1, 0), ((0, 1),), (4, 3)) == 4
+
+    #Under an overhang the shape is moved down row by row instead
+    matrix = BitMatrix(6, 4, rows=[0, 0, 0b0010, 0, 0, 0b1101])
+    assert matrix.heights == [1, 4, 1, 1]
+    assert matrix.landing_row((0b1,), ((0, 0),), (3, 1)) == 5
+    assert matrix.landing_row((0b1,), ((0, 0),), (0, 1)) == 1
+    matrix.place((0b1,), (5, 1), ('block', 'red'))
+    assert matrix.heights == [1, 4, 1, 1]
+    #Clearing the row under the overhang moves it down; columns whose top cell was cleared are rescanned
+    matrix.clear_rows(matrix.full_rows())
+    assert matrix.rows == [0, 0, 0, 0b0010, 0, 0]
+    assert matrix.heights == [0, 3, 0, 0]
+
+    #Heights and landing rows agree with a full scan and a row by row drop over many random placements
+    from pieces import pieces
+    rand = random.Random(0)
+    matrix = BitMatrix(22, 10)
+    cleared = 0
+    for _ in range(3000):
+        rotation = rand.choice(pieces).rotations[rand.randrange(4)]
+        position = (rand.randrange(4), rand.randrange(-2, 10))
+        if not matrix.fits(rotation.masks, position):
+            if matrix.rows[2]:
+                matrix = BitMatrix(22, 10)
+            continue
+        landing = position[0]
+        while matrix.fits(rotation.masks, (landing + 1, position[1])):
+            landing += 1
+        assert matrix.landing_row(rotation.masks, rotation.bottoms, position) == landing
+        matrix.place(rotation.masks, (landing, position[1]), ('block', 'red'))
+        lines = matrix.full_rows()
+        cleared += len(lines)
+        matrix.clear_rows(lines)
+        assert matrix.heights == [matrix.column_height(x) for x in range(10)]
+    assert cleared > 0
+
+    #Cells can be written one at a time too
+    matrix = BitMatrix(6, 4)
+    matrix[(0, 0)] = ('block', 'red')
+    assert matrix.rows[0] == 1 and matrix.heights[0] == 6
+    matrix[(0, 0)] = None
+    assert matrix.rows[0] == 0 and matrix.heights[0] == 0
+
+    print("All tests passed in {}, things seems to be working alright".format(__file__))
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,101 @@
+"""
+Checkpoints of a training run, so a run that stops part way can carry on where it stopped.
+A checkpoint is taken between episodes and holds everything the rest of the run depends on: the weights of both
+networks, the replay memory, epsilon, the step and episode counters, the random generators and the results so far.
+Checkpoints are written to a temporary file that is then renamed over the last one, so a crash while writing
+never leaves a broken checkpoint.
+"""
+from __future__ import print_function
+import argparse
+import os
+import pickle
+import time
+
+def write_atomic(path, data):
+    """
+    Writes the bytes `data` to `path` by writing a temporary file and renaming it to `path`
+    """
+    temporary_path = path + ".tmp"
+    with open(temporary_path, 'wb') as temporary_file:
+        temporary_file.write(data)
+        temporary_file.flush()
+        os.fsync(temporary_file.fileno())
+    os.replace(temporary_path, path)
+
+def save_checkpoint(path, checkpoint):
+    """
+    Pickles `checkpoint` to `path` atomically
+    """
+    write_atomic(path, pickle.dumps(checkpoint, protocol=pickle.HIGHEST_PROTOCOL))
+
+def load_checkpoint(path):
+    """
+    Returns the checkpoint saved to `path`
+    """
+    with open(path, 'rb') as checkpoint_file:
+        return pickle.load(checkpoint_file)
+
+class Checkpointer(object):
+    """
+    Decides when a run saves a checkpoint to `path`: every `episodes` episodes and whenever
+    `minutes` minutes have passed since the last checkpoint. Either can be None.
+    """
+
+    def __init__(self, path, episodes=None, minutes=None):
+        self.path = path
+        self.episodes = episodes
+        self.minutes = minutes
+        self.last_checkpoint = time.time()
+
+    def due(self, episode):
+        """
+        Returns True if a checkpoint should be taken now that `episode` episodes have been played
+        """
+        if self.episodes and episode % self.episodes == 0:
+            return True
+        return self.minutes is not None and time.time() - self.last_checkpoint >= self.minutes * 60
+
+    def save(self, checkpoint):
+        """
+        Saves `checkpoint` to the checkpoint file
+        """
+        save_checkpoint(self.path, checkpoint)
+        self.last_checkpoint = time.time()
+
+def parse_arguments(argv):
+    """
+    Reads the --checkpoint-* and --resume options from `argv`.
+    Returns `argv` without them, and the options.
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--checkpoint-episodes", type=int, default=None)
+    parser.add_argument("--checkpoint-minutes", type=float, default=None)
+    parser.add_argument("--checkpoint", default=None)
+    parser.add_argument("--resume", default=None)
+    options, remaining = parser.parse_known_args(argv[1:])
+    return argv[:1] + remaining, options
+
+
+def test():
+    import tempfile
+
+    path = os.path.join(tempfile.mkdtemp(), "run.ckpt")
+    checkpointer = Checkpointer(path, episodes=5)
+    assert not checkpointer.due(3) and checkpointer.due(10)
+    checkpointer.save({"episode": 10, "weights": [1, 2]})
+    checkpointer.save({"episode": 15, "weights": [3, 4]})
+    assert load_checkpoint(path) == {"episode": 15, "weights": [3, 4]}
+    assert not os.path.exists(path + ".tmp")
+
+    assert Checkpointer(path, minutes=0).due(3)
+    assert not Checkpointer(path, minutes=10).due(3)
+
+    argv, options = parse_arguments(["core.py", "-hh", "100", "--checkpoint-episodes", "50", "--resume", "run.ckpt"])
+    assert argv == ["core.py", "-hh", "100"]
+    assert options.checkpoint_episodes == 50 and options.resume == "run.ckpt"
+    assert options.checkpoint is None and options.checkpoint_minutes is None
+
+    print("All tests passed in {}, things seems to be working alright".format(__file__))
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,656 @@
+#!/usr/bin/env python
+"""
+Game logic for MaTris that does not depend on pygame.
+`MatrisCore` holds the matrix, the falling tetromino, scoring and the agent hooks,
+so it can be run headless for training or wrapped by the renderer in matris.py.
+"""
+import random
+import sys
+import pickle
+
+import agent
+from agent import board as agent_board
+from checkpoint import Checkpointer, load_checkpoint
+import checkpoint
+
+from bitmatrix import BitMatrix
+from pieces import piece_of, geometry
+from tetrominoes import list_of_tetrominoes
+
+from scores import load_score, write_score
+from training_log import logger, piece_sampled, episode_sampled, format_board
+import training_log
+
+MATRIX_WIDTH = 10
+MATRIX_HEIGHT = 22
+
+VISIBLE_MATRIX_HEIGHT = MATRIX_HEIGHT - 2
+
+USAGE = ("\n\nError inputting command line arguments\nUsage:\n[mode] [number of episodes]\nmode:\n"
+         "\t-hh - holes and height and column differences\n\t-ho - holes and column differences\n"
+         "\t-hi - height and column differences\n\t-no - column differences only\n\t-ra - random moves\n"
+         "\tLoad ANN\nSecond argument should be number of episodes\n third argument should be filepath if file is being loaded.")
+
+class GameOver(Exception):
+    """Exception used for its control flow properties"""
+
+def create_agent(argv, results_path=None, seeds=None):
+    """
+    Creates an agent from the command line arguments: <mode> <episode_number> <filepath>
+    The agent writes its results to `results_path` if given, otherwise to a timestamped file in results/.
+    It plays the games of the SeedStore `seeds` if given, otherwise those of the seeds file.
+    """
+    if len(argv) < 3:
+        raise ValueError(USAGE)
+    mode = argv[1]
+    episodes = int(argv[2])
+    if mode == "-hh":
+        #Creates an agent that takes column differences, holes and height of the tallest column as inputs
+        return agent.agent([], episodes, random_moves = False, rewards_as_lines=True, epsilon=1, epsilon_decay=0.01, epsilon_minimum=0.01, memory_size=1000, sample_size=32, reset_steps=1000, height=True, holes=True, results_path=results_path, seeds=seeds)
+    elif mode == "-ho":
+        #Creates an agent that takes column differences and holes as inputs
+        return agent.agent([], episodes, random_moves = False, rewards_as_lines=True, epsilon=1, epsilon_decay=0.01, epsilon_minimum=0.01, memory_size=1000, sample_size=32, reset_steps=1000, holes=True, results_path=results_path, seeds=seeds)
+    elif mode == "-hi":
+        #Creates an agent that takes column differences and height of the tallest column as inputs
+        return agent.agent([], episodes, random_moves = False, rewards_as_lines=True, epsilon=1, epsilon_decay=0.01, epsilon_minimum=0.01, memory_size=1000, sample_size=32, reset_steps=1000, height=True, results_path=results_path, seeds=seeds)
+    elif mode == "-no":
+        #Creates an agent that takes column differences as inputs only
+        return agent.agent([], episodes, random_moves = False, rewards_as_lines=True, epsilon=1, epsilon_decay=0.01, epsilon_minimum=0.01, memory_size=1000, sample_size=32, reset_steps=1000, results_path=results_path, seeds=seeds)
+    elif mode == "-ra":
+        #Creates an agent that plays randomly
+        return agent.agent([], episodes, random_moves = True, results_path=results_path, seeds=seeds)
+    elif mode == "-lo" and len(argv) > 3:
+        #Loads an agent that has previously been trained in MaTris. Loads .obj file.
+        return agent.agent([], episodes, random_moves = False, rewards_as_lines=True, epsilon=1, epsilon_decay=0.01, epsilon_minimum=0.01, memory_size=1000, sample_size=32, reset_steps=1000, filepath = argv[3], results_path=results_path, seeds=seeds)
+    elif mode == "-lt" and len(argv) > 3:
+        #Loads an agent that has previously been trained using supervised learning in MaTris-O. Loads .obj file.
+        return agent.agent([], episodes, random_moves = False, rewards_as_lines=True, epsilon=1, epsilon_decay=0.01, epsilon_minimum=0.01, memory_size=1000, sample_size=32, reset_steps=1000, filepath = argv[3], supervised=True, results_path=results_path, seeds=seeds)
+    raise ValueError(USAGE)
+
+class MatrisCore(object):
+    """
+    The rules of the game: the matrix, spawning, movement, locking, line clears and scoring.
+    If an agent is given, the agent chooses where every tetromino is placed.
+    A `checkpointer` saves the state of the run between episodes, and a checkpoint given as `resume`,
+    restored into the agent beforehand, carries on the run from the episode it was taken at.
+    """
+    tetromino_placement = None
+    cleared_rows = []
+
+    def __init__(self, agent=None, checkpointer=None, resume=None):
+        self.agent = agent
+        self.checkpointer = checkpointer
+        self.agent_mode = agent is not None #used to check if agent is playing. Causes hard-drops to always happen.
+        self.needs_redraw = False
+
+        if self.agent_mode == True:
+            random.seed(self.agent.load_new_seed())
+
+        self.matrix = self.empty_matrix()
+        """
+        `self.matrix` is the current state of the tetris board, that is, it records which squares are
+        currently occupied. It does not include the falling tetromino. The information relating to the
+        falling tetromino is managed by `self.set_tetrominoes` instead. When the falling tetromino "dies",
+        it will be placed in `self.matrix`.
+        """
+
+        self.next_tetromino = random.choice(list_of_tetrominoes)
+        self.set_tetrominoes()
+
+        if self.agent_mode == True:
+            #Creates a representation of the initial board
+            self.board = agent_board()
+            self.board.update_board_representation(self.create_board_representation())
+            self.board.set_features()
+
+            #Set up the the agent
+            self.agent.set_current_board(self.board)
+            self.agent.set_agent_tetromino(self.current_tetromino)
+
+        self.tetromino_rotation = 0
+
+        self.level = 1
+        self.score = 0
+        self.lines = 0
+        self.pieces_placed = 0
+
+        self.combo = 1 # Combo will increase when you clear lines with several tetrominos in a row
+
+        self.highscore = load_score()
+        self.played_highscorebeaten_sound = False
+
+        if self.agent_mode == True and resume is not None:
+            #Starts the episode the checkpoint was taken before, as it would have been started had the run not stopped
+            self.next_tetromino = list_of_tetrominoes[resume["next_tetromino"]]
+            self.level = resume["level"]
+            self.combo = resume["combo"]
+            random.setstate(resume["random"])
+            self.start_episode()
+        elif self.agent_mode == True:
+            #Agent's first move
+            self.tetromino_placement = self.agent.make_move()
+
+    def empty_matrix(self):
+        """
+        Returns a matrix with every cell unoccupied
+        """
+        return BitMatrix(MATRIX_HEIGHT, MATRIX_WIDTH)
+
+    def block(self, color, shadow=False):
+        """
+        Returns what is stored in the matrix for a cell of a tetromino.
+        The core only needs the color; renderers override this to build an image.
+        """
+        return color
+
+    def set_tetrominoes(self):
+        """
+        Sets information for the current and next tetrominos
+        """
+        self.current_tetromino = self.next_tetromino
+        self.next_tetromino = random.choice(list_of_tetrominoes)
+        self.tetromino_position = (0,4) if len(self.current_tetromino.shape) == 2 else (0, 3)
+        self.tetromino_rotation = 0
+        self.tetromino_block = self.block(self.current_tetromino.color)
+        self.shadow_block = self.block(self.current_tetromino.color, shadow=True)
+
+    def hard_drop(self):
+        """
+        Instantly places tetrominos in the cells below
+        """
+        posY, posX = self.tetromino_position
+        landing = self.landing_row(self.rotated(), self.tetromino_position)
+        if landing != posY:
+            self.tetromino_position = (landing, posX)
+            self.needs_redraw = True
+        self.score += 10*(landing - posY)
+
+        self.lock_tetromino()
+
+    def apply_placement(self, rotation, column):
+        """
+        Drops the falling tetromino straight down with `rotation` and the left of its shape at `column`, then locks it.
+        There is no wall-kick, so the tetromino always lands in the column that was chosen.
+        Returns the row the top of the shape landed on, or None if the tetromino topped out,
+        which in agent mode ends the episode and starts the next one rather than raising GameOver.
+        Raises ValueError if the tetromino would be outside the matrix.
+        """
+        shape = self.rotated(rotation)
+        position = (0, column)
+        if not self.fits_in_matrix(shape, position):
+            raise ValueError("Placement of rotation {} at column {} is outside the matrix".format(rotation, column))
+
+        self.tetromino_rotation = rotation % 4
+        self.tetromino_position = position
+        if self.collides(shape, position):
+            #The stack is too high for the tetromino to enter the matrix
+            self.top_out()
+            return None
+
+        landing = self.landing_row(shape, position)
+        self.tetromino_position = (landing, column)
+        self.score += 10*landing
+
+        self.lock_tetromino()
+        return landing
+
+    def agent_step(self):
+        """
+        Lets the agent place the current tetromino where it chose to.
+        Errors raised while the agent is playing end the episode rather than the whole run.
+        """
+        try:
+            self.apply_placement(self.tetromino_placement[0], self.tetromino_placement[2])
+        except GameOver:
+            raise
+        except Exception:
+            logger.exception("Error in agent running. Manually causing gameover. Preserves continuation of agent running "
+                             "with minor potential impediment on learning. Board:\n%s", format_board(self.create_board_representation()))
+            self.gameover()
+            self.needs_redraw = True
+        return self.needs_redraw
+
+    def run(self):
+        """
+        Plays every episode of the agent without drawing anything
+        """
+        try:
+            while True:
+                self.agent_step()
+        except GameOver:
+            return
+
+    def gameover(self, full_exit=False):
+        """
+        Gameover occurs when a new tetromino does not fit after the old one has died, either
+        after a "natural" drop or a hard drop by the player. That is why `self.lock_tetromino`
+        is responsible for checking if it's game over.
+
+        In agent mode a new episode is started until the agent has played all of its episodes.
+        GameOver is raised once the game, or the whole run, has finished.
+        """
+
+        write_score(self.score)
+
+        if full_exit:
+            if self.agent_mode == True:
+                logger.info("Runs completed.")
+                self.serialize_agent()
+                self.agent.close_results()
+            raise GameOver("Exit")
+
+        if self.agent_mode == False:
+            raise GameOver("Sucker!")
+
+        if episode_sampled(self.agent.current_episode):
+            logger.info("Episode %d / %d: lines %d, score %d, pieces %d, epsilon %.4g", self.agent.current_episode + 1,
+                        self.agent.number_of_episodes, self.lines, self.score, self.pieces_placed, self.agent.epsilon)
+        self.agent.complete_episode(self.score, self.pieces_placed)
+        #Manages the starting of a new game
+        if self.agent.get_current_episode() < self.agent.get_number_of_episodes():
+            if self.checkpointer is not None and self.checkpointer.due(self.agent.get_current_episode()):
+                self.checkpointer.save(self.checkpoint_state())
+            self.start_episode()
+        else:
+            logger.info("Runs completed.")
+            self.serialize_agent()
+            self.agent.close_results()
+            raise GameOver("Runs completed.")
+
+    def start_episode(self):
+        """
+        Clears the board and starts the agent's next game with the seed of its current episode.
+        Raises GameOver if there is no seed for the episode.
+        """
+        #Resets the board
+        self.matrix = self.empty_matrix()
+        self.score = 0
+        self.lines = 0
+        self.pieces_placed = 0
+        self.board = agent_board(self.create_board_representation())
+        self.board.set_features()
+        self.agent.set_current_board(self.board)
+        new_seed = self.agent.load_new_seed()
+        if new_seed == None:
+            logger.warning("Not enough seeds for current experiment! Exiting Matris...")
+            self.agent.close_results()
+            raise GameOver("Not enough seeds for current experiment!")
+        logger.debug("Generating new game with seed: %s", new_seed)
+        random.seed(new_seed)
+        self.set_tetrominoes()
+        self.next_tetromino = random.choice(list_of_tetrominoes)
+        self.agent.set_agent_tetromino(self.current_tetromino)
+
+        #Agent's first move of the new game
+        self.tetromino_placement = self.agent.make_move()
+
+    def checkpoint_state(self):
+        """
+        Returns a checkpoint of the run, taken between two episodes: the state of the agent,
+        and the state of the game that carries over into the next episode.
+        """
+        return {"agent": self.agent.checkpoint_state(),
+                "next_tetromino": list_of_tetrominoes.index(self.next_tetromino),
+                "level": self.level,
+                "combo": self.combo,
+                "random": random.getstate()}
+
+    def place_shadow(self):
+        """
+        Places the shadow of the tetromino so player can see where it will be placed
+        """
+        posY, posX = self.tetromino_position
+        position = (self.landing_row(self.rotated(), self.tetromino_position), posX)
+
+        return self.blend(position=position, shadow=True)
+
+    def fits_in_matrix(self, shape, position):
+        """
+        Checks if tetromino fits on the board
+        """
+        if not self.matrix.in_bounds(geometry(shape).masks, position): # outside matrix
+            return False
+
+        return position
+
+
+    def request_rotation(self):
+        """
+        Checks if tetromino can rotate
+        Returns the tetromino's rotation position if possible
+        """
+        rotation = (self.tetromino_rotation + 1) % 4
+        shape = self.rotated(rotation)
+
+        y, x = self.tetromino_position
+
+        position = (self.fits_in_matrix(shape, (y, x)) or
+                    self.fits_in_matrix(shape, (y, x+1)) or
+                    self.fits_in_matrix(shape, (y, x-1)) or
+                    self.fits_in_matrix(shape, (y, x+2)) or
+                    self.fits_in_matrix(shape, (y, x-2)))
+        # ^ That's how wall-kick is implemented
+
+        if position and not self.collides(shape, position):
+            self.tetromino_rotation = rotation
+            self.tetromino_position = position
+
+            self.needs_redraw = True
+            return self.tetromino_rotation
+        else:
+            return False
+
+    def request_movement(self, direction):
+        """
+        Checks if teteromino can move in the given direction and returns its new position if movement is possible
+        """
+        shape = self.rotated()
+        posY, posX = self.tetromino_position
+        if direction == 'left' and not self.collides(shape, (posY, posX-1)):
+            self.tetromino_position = (posY, posX-1)
+            self.needs_redraw = True
+            return self.tetromino_position
+        elif direction == 'right' and not self.collides(shape, (posY, posX+1)):
+            self.tetromino_position = (posY, posX+1)
+            self.needs_redraw = True
+            return self.tetromino_position
+        elif direction == 'up' and not self.collides(shape, (posY-1, posX)):
+            self.needs_redraw = True
+            self.tetromino_position = (posY-1, posX)
+            return self.tetromino_position
+        elif direction == 'down' and not self.collides(shape, (posY+1, posX)):
+            self.needs_redraw = True
+            self.tetromino_position = (posY+1, posX)
+            return self.tetromino_position
+        else:
+            return False
+
+    def rotated(self, rotation=None):
+        """
+        Rotates tetromino
+        """
+        if rotation is None:
+            rotation = self.tetromino_rotation
+        return piece_of(self.current_tetromino).rotations[rotation % 4].shape
+
+    def lock_tetromino(self):
+        """
+        This method is called whenever the falling tetromino "dies". `self.matrix` is updated,
+        the lines are counted and cleared, and a new tetromino is chosen.
+        """
+        if not self.commit():
+            #The tetromino overlaps the stack where it stands, which happens when the stack
+            #has grown higher than the two hidden rows above the skyline.
+            self.top_out()
+            return
+        self.pieces_placed += 1
+        placed_cells = self.tetromino_cells()
+
+        lines_cleared = self.remove_lines()
+
+        self.lines += lines_cleared
+
+        if lines_cleared:
+            self.score += 100 * (lines_cleared**2) * self.combo
+
+            if not self.played_highscorebeaten_sound and self.score > self.highscore:
+                self.played_highscorebeaten_sound = True
+
+        if self.lines >= self.level*10:
+            self.level += 1
+
+            self.combo = self.combo + 1 if lines_cleared else 1
+
+        self.set_tetrominoes()
+
+        self.needs_redraw = True
+
+        if self.collides(self.rotated(), self.tetromino_position):
+            #The new tetromino does not fit where it appears
+            self.top_out()
+            return
+
+        if self.agent_mode == True:
+            #Updates the board with the cells of the tetromino and the cleared lines
+            self.board.update_features(placed_cells, self.cleared_rows)
+            reward = self.agent.update_score_and_lines(self.score, self.lines)
+            if piece_sampled(self.pieces_placed):
+                logger.debug(self.piece_report(reward))
+
+
+            #Passes tetromino and board information to the agent.
+            self.agent.set_agent_tetromino(self.current_tetromino)
+            self.agent.set_current_board(self.board)
+
+            #Remembers previous S,A,R,S
+            if self.agent.check_game_over():  #Ends episode if previous turn was terminal
+                #End of episode
+                if self.agent.random_moves == False:
+                    self.agent.remember_state_action(self.agent.previous_state, self.agent.previous_action, -1000, self.agent.get_current_board(), True)
+                    self.agent.update_approximater()
+                    self.agent.reset_approximaters()
+                self.gameover()
+            else:   #Continue episode as not in terminal state
+                self.tetromino_placement = self.agent.make_move()
+
+                if self.tetromino_placement == False:
+                    #Tetromino placed in state that causes a game over
+                    if self.agent.random_moves == False:
+                        #Tetromino placed in state that causes a game over
+                        self.agent.remember_state_action(self.agent.previous_state, self.agent.previous_action, -1000, self.agent.get_current_board(), True)
+                        self.agent.update_approximater()
+                        self.agent.reset_approximaters()
+                    self.gameover()
+                else:
+                    #Tetromino placed in a non-terminal state.
+                    if self.agent.random_moves == False:
+                        self.agent.remember_state_action(self.agent.previous_state, self.agent.previous_action, reward, self.agent.get_current_board(), False)
+                        self.agent.update_approximater()
+                        self.agent.reset_approximaters()
+
+    def piece_report(self, reward):
+        """
+        Returns a description of the tetromino the agent just placed and the board it left, for the training log
+        """
+        lines = ["Column Height Differences:" + str(self.board.get_column_differences())]
+        if self.agent.holes == True:
+            lines.append("Holes: " + str(self.board.get_holes()))
+        if self.agent.height == True:
+            lines.append("Height: " + str(self.board.get_board_height()))
+        lines.append("Placement: " + str(self.tetromino_placement))
+        lines.append("Tetromino:\n" + format_board(self.agent.agent_tetromino[0]))
+        lines.append("Epsilon: " + str(self.agent.epsilon))
+        lines.append("Reward: " + str(reward))
+        lines.append("Score: " + str(self.agent.score))
+        lines.append("Lines Cleared: " + str(self.agent.lines_cleared))
+        lines.append("Current Episode number: " + str(self.agent.current_episode+1) + " / " + str(self.agent.number_of_episodes))
+        if training_log.boards:
+            lines.append("Board:\n" + format_board(self.board.get_board_representation()))
+        return "\n".join(lines)
+
+    def top_out(self):
+        """
+        Ends the game because a tetromino could not be placed in the matrix.
+        In agent mode the agent's last move is remembered as terminal, the board is cleared and a new episode started.
+        """
+        if self.agent_mode == True and self.agent.random_moves == False:
+            self.agent.remember_state_action(self.agent.previous_state, self.agent.previous_action, -1000, self.agent.get_current_board(), True)
+            self.agent.update_approximater()
+            self.agent.reset_approximaters()
+        self.gameover()
+
+    def remove_lines(self):
+        """
+        Removes full lines from the board and returns how many were removed.
+        A full row is one whose bits are all set, so finding them is one comparison per row.
+        """
+        lines = self.matrix.full_rows()
+        #Rows above the cleared lines move down in a single pass
+        self.matrix.clear_rows(lines)
+        self.cleared_rows = lines
+
+        return len(lines)
+
+    def collides(self, shape, position):
+        """
+        Checks if `shape` at `position` would be outside the matrix or overlap an occupied cell.
+        Nothing is copied, so this is used to test whether every move is valid.
+        """
+        return not self.matrix.fits(geometry(shape).masks, position)
+
+    def landing_row(self, shape, position):
+        """
+        Returns the row `shape` would land on if dropped from `position`,
+        using the column heights and the bottom profile of the shape
+        """
+        rotation = geometry(shape)
+        return self.matrix.landing_row(rotation.masks, rotation.bottoms, position)
+
+    def commit(self, shape=None, position=None):
+        """
+        Places `shape` at `position` into `self.matrix`, defaulting to the falling tetromino.
+        Returns False and leaves the matrix unchanged if it does not fit.
+        """
+        if shape is None:
+            shape = self.rotated()
+        if position is None:
+            position = self.tetromino_position
+
+        masks = geometry(shape).masks
+        if not self.matrix.fits(masks, position):
+            return False
+        self.matrix.place(masks, position, ('block', self.tetromino_block))
+        return True
+
+    def tetromino_cells(self, shape=None, position=None):
+        """
+        Returns the (row, column) of every cell of `shape` at `position`, defaulting to the falling tetromino
+        """
+        if shape is None:
+            shape = self.rotated()
+        if position is None:
+            position = self.tetromino_position
+        posY, posX = position
+        cells = geometry(shape).cells
+        return [(posY + y, posX + x) for y in range(len(cells)) for x in range(len(cells[y])) if cells[y][x]]
+
+    def blend(self, shape=None, position=None, matrix=None, shadow=False):
+        """
+        Does `shape` at `position` fit in `matrix`? If so, return a new copy of `matrix` where all
+        the squares of `shape` have been placed in `matrix`. Otherwise, return False.
+
+        This is only used in `Matris.draw_surface` to paint the falling tetromino and its shadow on the screen;
+        use `self.collides` to test moves and `self.commit` to lock a tetromino.
+        """
+        if shape is None:
+            shape = self.rotated()
+        if position is None:
+            position = self.tetromino_position
+
+        if matrix is None:
+            matrix = self.matrix
+
+        masks = geometry(shape).masks
+        # Shape is outside the matrix or a coordinate is occupied by something else which isn't a shadow
+        if not matrix.fits(masks, position):
+            return False # Blend failed; `shape` at `position` breaks the matrix
+
+        copy = matrix.copy()
+        copy.place(masks, position, ('shadow', self.shadow_block) if shadow else ('block', self.tetromino_block))
+
+        return copy
+
+    def create_board_representation(self):
+        """
+        Returns the matrix as rows of 0 (empty) and 1 (full) for the agent
+        """
+        return self.matrix.representation()
+
+    def serialize_agent(self):
+        """
+        Serializes the agent.
+        This saves the epsilon value, whether holes or height was used and the current ANN of the agent.
+        """
+        agent_information = [self.agent.epsilon, self.agent.holes, self.agent.height, self.agent.current_net]
+        handler = open(self.agent.file_path + ".obj", 'wb')
+        pickle.dump(agent_information, handler)
+        handler.close()
+
+def agent_from_arguments(argv):
+    """
+    Creates an agent from the command line arguments, along with the checkpoint options:
+    --checkpoint-episodes N and --checkpoint-minutes M save a checkpoint every N episodes or M minutes,
+    to --checkpoint PATH or to the results path of the agent with .ckpt added, and --resume PATH carries on from one.
+    Returns the agent, its Checkpointer or None, and the checkpoint it was restored from or None.
+    """
+    argv, options = checkpoint.parse_arguments(argv)
+    resume = load_checkpoint(options.resume) if options.resume else None
+    if resume is None:
+        new_agent = create_agent(argv)
+    else:
+        #The agent carries on writing to the results file of the run it resumes
+        new_agent = create_agent(argv, results_path=resume["agent"]["file_path"])
+        new_agent.restore_state(resume["agent"])
+    checkpointer = None
+    if options.checkpoint_episodes or options.checkpoint_minutes is not None:
+        checkpointer = Checkpointer(options.checkpoint or new_agent.file_path + ".ckpt", options.checkpoint_episodes, options.checkpoint_minutes)
+    return new_agent, checkpointer, resume
+
+
+def test():
+    import os
+    import tempfile
+    import scores
+
+    #Scores of the test games are not kept
+    scores.scorefile = os.path.join(tempfile.mkdtemp(), ".highscores")
+    random.seed(0)
+    game = MatrisCore()
+    tetromino = game.current_tetromino
+    rotation = piece_of(tetromino).rotations[0]
+    lowest_row = max(y for y in range(len(rotation.masks)) if rotation.masks[y])
+
+    #A tetromino dropped on an empty matrix lands with its lowest cells on the bottom row
+    landing = game.apply_placement(0, 0)
+    assert landing == MATRIX_HEIGHT - 1 - lowest_row
+    assert game.score == 10*landing
+    assert game.matrix.rows[MATRIX_HEIGHT - 1] == rotation.masks[lowest_row]
+
+    #Placements outside the matrix are refused without changing the game
+    score = game.score
+    for column in (MATRIX_WIDTH, -len(game.current_tetromino.shape)):
+        try:
+            game.apply_placement(0, column)
+            assert False
+        except ValueError:
+            pass
+    assert game.score == score
+
+    #A tetromino that collides where it enters the matrix ends the game
+    for y in range(4):
+        game.matrix.rows[y] = game.matrix.full_row
+    try:
+        game.apply_placement(0, 0)
+        assert False
+    except GameOver:
+        pass
+
+    #In agent mode topping out starts the next episode instead, and no landing row is returned
+    from seeds import SeedStore, generate_seeds
+    random_agent = agent.agent([], 2, results_path=os.path.join(tempfile.mkdtemp(), "results"),
+                               seeds=SeedStore(generate_seeds(5, master_seed=1)))
+    game = MatrisCore(random_agent)
+    for y in range(4):
+        game.matrix.rows[y] = game.matrix.full_row
+    assert game.apply_placement(0, 0) is None
+    assert random_agent.get_current_episode() == 1 and game.score == 0
+    random_agent.close_results()
+
+    print("All tests passed in {}, things seems to be working alright".format(__file__))
+
+if __name__ == '__main__':
+    if len(sys.argv) == 1:
+        test()
+    else:
+        #Trains or runs the agent without opening a window
+        MatrisCore(*agent_from_arguments(training_log.configure_from_arguments(sys.argv))).run()
@@ -1,9 +1,4 @@
 #!/bin/bash
 cd ../
-mkdir results
-for (( i=1; i<=25; i++ ))
-do
-	python3 ./matris.py -hh 10000
-done
-
-
+#Runs all 25 runs in parallel, one worker per core; see experiments.py
+python3 ./experiments.py hh --runs 25 --episodes 10000 --output results/experiments-HH.csv
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""
+Runs the experiments of experiment_scripts/ in parallel.
+Every run trains a fresh agent headless with core.MatrisCore in its own worker process,
+and the lines cleared in every episode of every run are gathered into results/experiments.csv.
+
+Usage: python3 experiments.py [modes] [--runs 25] [--episodes 10000] [--processes N]
+"""
+from __future__ import print_function
+import argparse
+import csv
+import multiprocessing
+import os
+
+MODES = ["hh", "ho", "hi", "no"]
+
+#Every path used by the game and the agent is relative to the directory of the game
+GAME_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+def run_path(mode, run):
+    """
+    Returns the path, without extension, of the results of one run
+    """
+    return os.path.join("results", "{}-run-{:02d}".format(mode.upper(), run))
+
+def start_worker():
+    """
+    Prepares a worker process: one thread per backend so the workers do not fight over the cores
+    """
+    os.environ["OMP_NUM_THREADS"] = "1"
+    os.environ["MKL_NUM_THREADS"] = "1"
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    os.environ["TF_NUM_INTRAOP_THREADS"] = "1"
+
+def run_experiment(experiment):
+    """
+    Trains one agent for every episode without drawing anything.
+    Returns the mode, the run and the (episode, lines cleared) of every episode.
+    """
+    mode, run, episodes = experiment
+    os.chdir(GAME_DIRECTORY)
+    #Imported here so that Keras is only loaded by the workers, once each
+    from core import MatrisCore, create_agent
+
+    path = run_path(mode, run)
+    MatrisCore(create_agent(["experiments.py", "-" + mode, str(episodes)], results_path=path)).run()
+    with open(path + ".csv") as results_file:
+        reader = csv.reader(results_file)
+        next(reader)
+        results = [(int(row[0]), int(row[1])) for row in reader if row]
+    return mode, run, results
+
+def run_experiments(modes=MODES, runs=25, episodes=10000, processes=None, results_file_path="results/experiments.csv"):
+    """
+    Runs `runs` runs of every mode over a pool of `processes` workers, one per core by default.
+    Each run is added to `results_file_path` as soon as it finishes, as rows of mode,run,episode,lines.
+    """
+    os.chdir(GAME_DIRECTORY)
+    if not os.path.isdir("results"):
+        os.makedirs("results")
+    experiments = [(mode, run, episodes) for mode in modes for run in range(1, runs + 1)]
+    processes = min(processes or multiprocessing.cpu_count(), len(experiments))
+
+    pool = multiprocessing.Pool(processes, initializer=start_worker)
+    try:
+        with open(results_file_path, 'w') as results_file:
+            writer = csv.writer(results_file)
+            writer.writerow(["mode", "run", "episode", "lines"])
+            finished = 0
+            for mode, run, results in pool.imap_unordered(run_experiment, experiments):
+                writer.writerows([mode, run, episode, lines] for episode, lines in results)
+                results_file.flush()
+                finished += 1
+                print("{}/{} runs finished: {} run {}".format(finished, len(experiments), mode, run))
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Runs MaTris agent experiments in parallel without a display.")
+    parser.add_argument("modes", nargs="*", default=MODES, choices=MODES + ["ra"], help="agent modes to run, all but ra by default")
+    parser.add_argument("--runs", type=int, default=25, help="runs of each mode")
+    parser.add_argument("--episodes", type=int, default=10000, help="episodes of each run")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes, one per core by default")
+    parser.add_argument("--output", default=os.path.join(GAME_DIRECTORY, "results", "experiments.csv"), help="file the results of every run are gathered into")
+    arguments = parser.parse_args()
+    run_experiments(arguments.modes, arguments.runs, arguments.episodes, arguments.processes, os.path.abspath(arguments.output))
@@ -0,0 +1,86 @@
+"""
+Features of MaTris boards that the agent uses as inputs and rewards, worked out in one NumPy pass.
+Works on a single board, given as rows of 0s and 1s, or on a stack of boards of any shape (..., rows, columns).
+"""
+from __future__ import print_function
+from collections import namedtuple
+
+import numpy as np
+
+#Largest column difference given to the agent; bigger differences are clipped to it
+MAXIMUM_COLUMN_DIFFERENCE = 4
+
+BoardFeatures = namedtuple("BoardFeatures", "heights max_height cum_height holes_per_column holes column_differences punishment")
+"""
+`heights` is the height of every column; 0 for an empty column.
+`max_height` is the height of the tallest column and `cum_height` the sum of all heights.
+`holes_per_column` counts the empty cells under the top cell of every column, and `holes` their sum.
+`column_differences` is the height of the column on the left minus the height of each column, clipped to
+±MAXIMUM_COLUMN_DIFFERENCE, with 0 for the first column.
+`punishment` is the height of the tallest column minus the height of the lowest column.
+For a stack of boards every feature has one extra leading dimension per dimension of the stack.
+"""
+
+def board_features(boards):
+    """
+    Returns the BoardFeatures of a board or of a stack of boards
+    """
+    boards = np.asarray(boards)
+    if boards.dtype != bool:
+        boards = boards != 0
+    rows = boards.shape[-2]
+
+    #The first full cell from the top of each column gives its height
+    full_cells = boards.sum(axis=-2)
+    heights = np.where(full_cells > 0, rows - boards.argmax(axis=-2), 0)
+    #Every cell under the top of a column is either full or a hole
+    holes_per_column = heights - full_cells
+
+    column_differences = np.zeros_like(heights)
+    column_differences[..., 1:] = np.minimum(np.maximum(heights[..., :-1] - heights[..., 1:],
+                                                        -MAXIMUM_COLUMN_DIFFERENCE), MAXIMUM_COLUMN_DIFFERENCE)
+
+    max_height = heights.max(axis=-1)
+    return BoardFeatures(heights=heights,
+                         max_height=max_height,
+                         cum_height=heights.sum(axis=-1),
+                         holes_per_column=holes_per_column,
+                         holes=holes_per_column.sum(axis=-1),
+                         column_differences=column_differences,
+                         punishment=max_height - heights.min(axis=-1))
+
+
+def test():
+    empty = [[0] * 10 for _ in range(22)]
+    features = board_features(empty)
+    assert features.heights.tolist() == [0] * 10
+    assert features.max_height == 0 and features.cum_height == 0 and features.holes == 0
+    assert features.column_differences.tolist() == [0] * 10
+
+    board = [[0] * 10 for _ in range(22)]
+    board[21] = [1, 1, 1, 1, 1, 1, 1, 1, 1, 0]
+    board[20][0] = 1
+    board[15][0] = 1
+    board[19][3] = 1
+    features = board_features(board)
+    assert features.heights.tolist() == [7, 1, 1, 3, 1, 1, 1, 1, 1, 0]
+    assert features.max_height == 7
+    assert features.cum_height == 17
+    assert features.holes_per_column.tolist() == [4, 0, 0, 1, 0, 0, 0, 0, 0, 0]
+    assert features.holes == 5
+    assert features.column_differences.tolist() == [0, 4, 0, -2, 2, 0, 0, 0, 0, 1]
+    assert features.punishment == 7
+
+    #A stack of boards gives the same features as each board on its own
+    stack = np.random.RandomState(0).rand(3, 5, 22, 10) < 0.3
+    stacked = board_features(stack)
+    for i in range(3):
+        for j in range(5):
+            single = board_features(stack[i, j].astype(int).tolist())
+            for name in BoardFeatures._fields:
+                assert np.array_equal(getattr(stacked, name)[i, j], getattr(single, name))
+
+    print("All tests passed in {}, things seems to be working alright".format(__file__))
+
+if __name__ == '__main__':
+    test()
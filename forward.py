@@ -0,0 +1,124 @@
+"""
+Forward pass of the agent's networks in NumPy.
+Keras is only needed to train a network; choosing moves and working out targets
+only multiply a few small matrices, which is far quicker without the overhead of `predict`.
+"""
+from __future__ import print_function
+
+import numpy as np
+
+activations = {
+    'linear': lambda x: x,
+    'tanh': np.tanh,
+    'relu': lambda x: np.maximum(x, 0),
+    'sigmoid': lambda x: 1 / (1 + np.exp(-x)),
+}
+
+class ForwardNet(object):
+    """
+    A copy of the weights of a Keras Sequential network of Dense layers that can only predict.
+    `sync` must be called whenever the weights of the network change.
+    """
+
+    def __init__(self, model):
+        self.activations = []
+        for layer in model.layers:
+            name = layer.get_config()['activation']
+            if name not in activations:
+                raise ValueError("No NumPy version of the {} activation".format(name))
+            self.activations.append(activations[name])
+        self.sync(model)
+
+    def sync(self, model):
+        """
+        Copies the current weights of `model`
+        """
+        self.set_weights(model.get_weights())
+
+    def set_weights(self, weights):
+        """
+        Uses `weights`, a list of kernel and bias pairs as returned by `get_weights`
+        """
+        if len(weights) != 2 * len(self.activations):
+            raise ValueError("Expected a kernel and a bias for each of the {} layers".format(len(self.activations)))
+        self.kernels = [np.array(kernel) for kernel in weights[0::2]]
+        self.biases = [np.array(bias) for bias in weights[1::2]]
+
+    def get_weights(self):
+        """
+        Returns the weights as a list of kernel and bias pairs, as `get_weights` of the network does
+        """
+        weights = []
+        for kernel, bias in zip(self.kernels, self.biases):
+            weights.extend([kernel, bias])
+        return weights
+
+    def predict(self, states):
+        """
+        Returns the outputs of the network for a (states, inputs) array
+        """
+        values = np.asarray(states, dtype=self.kernels[0].dtype)
+        for kernel, bias, activation in zip(self.kernels, self.biases, self.activations):
+            values = activation(values.dot(kernel) + bias)
+        return values
+
+
+def test():
+    class Layer(object):
+        def __init__(self, activation):
+            self.activation = activation
+
+        def get_config(self):
+            return {'activation': self.activation}
+
+    class Model(object):
+        def __init__(self, weights, activations):
+            self.layers = [Layer(activation) for activation in activations]
+            self.weights = weights
+
+        def get_weights(self):
+            return self.weights
+
+    kernel1 = np.array([[1., -2., 0.5], [0., 1., -1.]])
+    bias1 = np.array([0.5, 0., -0.25])
+    kernel2 = np.array([[2.], [-1.], [3.]])
+    bias2 = np.array([1.])
+    model = Model([kernel1, bias1, kernel2, bias2], ['relu', 'linear'])
+    net = ForwardNet(model)
+
+    def expected(states):
+        return np.maximum(np.asarray(states).dot(kernel1) + bias1, 0).dot(kernel2) + bias2
+
+    #A single state, worked out by hand: hidden = relu([3.5, -5, 0.25]) = [3.5, 0, 0.25]
+    assert np.allclose(net.predict([[3., 1.]]), [[8.75]])
+    states = np.array([[3., 1.], [-1., 2.], [0., 0.], [2., -3.]])
+    assert net.predict(states).shape == (4, 1)
+    assert np.allclose(net.predict(states), expected(states))
+
+    #get_weights gives back the weights in the order set_weights takes them
+    weights = net.get_weights()
+    assert len(weights) == 4 and all(np.array_equal(a, b) for a, b in zip(weights, model.get_weights()))
+
+    #New weights are only used once they are synced
+    model.weights = [kernel1, bias1, -kernel2, bias2]
+    assert np.allclose(net.predict(states), expected(states))
+    net.sync(model)
+    assert np.allclose(net.predict(states), 2 * bias2 - expected(states))
+    net.set_weights(weights)
+    assert np.allclose(net.predict(states), expected(states))
+
+    try:
+        net.set_weights(weights[:2])
+        assert False
+    except ValueError:
+        pass
+    try:
+        ForwardNet(Model(weights[:2], ['softmax']))
+        assert False
+    except ValueError:
+        pass
+
+    print("All tests passed in {}, things seems to be working alright".format(__file__))
+
+if __name__ == '__main__':
+    test()
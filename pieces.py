@@ -0,0 +1,130 @@
+"""
+Geometry of every rotation of every tetromino, worked out once when the module is imported.
+The table is built from `list_of_tetrominoes`, so it follows whichever tetrominoes.py is in use,
+and is shared by the game (core.py) and the agent (agent.py).
+"""
+from __future__ import print_function
+from collections import namedtuple
+
+from tetrominoes import list_of_tetrominoes
+from tetrominoes import rotate
+
+Piece = namedtuple("Piece", "tetromino rotations")
+"""
+`rotations` holds the four rotations of `tetromino`, turning right.
+"""
+
+Rotation = namedtuple("Rotation", "shape cells trimmed left_trimmed masks bottoms tops trimmed_bottoms encoding")
+"""
+`shape` is the rotation as used by the game, with X and None cells.
+`cells` is the same rotation with 1 and 0 cells, as used by the agent.
+`trimmed` is `cells` without empty rows and columns; `left_trimmed` is how many empty columns were on its left.
+`masks` has one bit mask per row of `shape`, bit x set if column x is filled.
+`bottoms` and `tops` hold a (column, row) pair for the lowest and highest filled cell of each filled column of `shape`.
+`trimmed_bottoms` is the number of empty cells under each column of `trimmed`.
+`encoding` is the first two rows of `cells`, each padded to 4 cells. The agent's network
+takes the encoding of the unrotated tetromino as 8 of its inputs.
+"""
+
+def make_rotation(shape):
+    """
+    Works out the geometry of a square shape given with either X/None or 1/0 cells
+    """
+    size = len(shape)
+    cells = tuple(tuple(1 if cell else 0 for cell in row) for row in shape)
+    shape = tuple(tuple('X' if cell else None for cell in row) for row in shape)
+
+    filled_columns = [x for x in range(size) if any(row[x] for row in cells)]
+    filled_rows = [y for y in range(size) if any(cells[y])]
+    trimmed = tuple(tuple(cells[y][x] for x in filled_columns) for y in filled_rows)
+
+    bottoms = tuple((x, max(y for y in range(size) if cells[y][x])) for x in filled_columns)
+    tops = tuple((x, min(y for y in range(size) if cells[y][x])) for x in filled_columns)
+    trimmed_bottoms = tuple(filled_rows[-1] - bottom for x, bottom in bottoms)
+    encoding = tuple(cells[y][x] if y < size and x < size else 0 for y in range(2) for x in range(4))
+
+    return Rotation(shape=shape,
+                    cells=cells,
+                    trimmed=trimmed,
+                    left_trimmed=filled_columns[0] if filled_columns else 0,
+                    masks=tuple(sum(1 << x for x in range(size) if row[x]) for row in cells),
+                    bottoms=bottoms,
+                    tops=tops,
+                    trimmed_bottoms=trimmed_bottoms,
+                    encoding=encoding)
+
+def make_piece(tetromino):
+    """
+    Works out the four rotations of a tetromino
+    """
+    return Piece(tetromino=tetromino,
+                 rotations=tuple(make_rotation(rotate(tetromino.shape, times)) for times in range(4)))
+
+pieces = [make_piece(tetromino) for tetromino in list_of_tetrominoes]
+
+pieces_by_name = dict((piece.tetromino.name, piece) for piece in pieces)
+
+#Every rotation, found either by its X/None shape or by its 1/0 cells
+rotations_by_shape = {}
+for piece in pieces:
+    for rotation in piece.rotations:
+        rotations_by_shape[rotation.shape] = rotation
+        rotations_by_shape[rotation.cells] = rotation
+
+def piece_of(tetromino):
+    """
+    Returns the Piece of a tetromino from `list_of_tetrominoes`
+    """
+    return pieces_by_name[tetromino.name]
+
+def geometry(shape):
+    """
+    Returns the Rotation of any shape, working it out and remembering it if it is not in the table
+    """
+    try:
+        return rotations_by_shape[shape]
+    except (KeyError, TypeError):
+        shape = tuple(tuple(row) for row in shape)
+        if shape not in rotations_by_shape:
+            rotations_by_shape[shape] = make_rotation(shape)
+        return rotations_by_shape[shape]
+
+
+def test():
+    for piece in pieces:
+        for times in range(4):
+            rotation = piece.rotations[times]
+            assert rotation.shape == rotate(piece.tetromino.shape, times)
+            assert geometry(rotation.shape) == rotation
+            assert geometry(rotation.cells) == rotation
+            assert geometry([list(row) for row in rotation.cells]) == rotation
+            assert sum(map(sum, rotation.trimmed)) == sum(map(sum, rotation.cells))
+
+    #Tests for the table
+    if "long" in pieces_by_name:
+        long = pieces_by_name["long"]
+        assert long.rotations[0].encoding == (0,0,0,0,1,1,1,1)
+        assert long.rotations[0].trimmed == ((1,1,1,1),)
+        assert long.rotations[1].trimmed == ((1,),(1,),(1,),(1,))
+        assert long.rotations[1].left_trimmed == 2
+        assert long.rotations[0].masks == (0, 15, 0, 0)
+        assert long.rotations[0].bottoms == ((0,1),(1,1),(2,1),(3,1))
+
+    if "square" in pieces_by_name:
+        square = pieces_by_name["square"]
+        assert square.rotations[0].encoding == (1,1,0,0,1,1,0,0)
+        assert square.rotations[3].trimmed == ((1,1),(1,1))
+        assert square.rotations[0].left_trimmed == 0
+
+    if "hat" in pieces_by_name:
+        hat = pieces_by_name["hat"]
+        assert hat.rotations[0].encoding == (0,1,0,0,1,1,1,0)
+        assert hat.rotations[2].trimmed == ((1,1,1),(0,1,0))
+        assert hat.rotations[2].bottoms == ((0,1),(1,2),(2,1))
+        assert hat.rotations[2].tops == ((0,1),(1,1),(2,1))
+        assert hat.rotations[2].trimmed_bottoms == (1,0,1)
+
+    print("All tests passed in {}, things seems to be working alright".format(__file__))
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,255 @@
+"""
+Replay memory of the agent, stored as fixed-width records in a NumPy array allocated once.
+Remembering an event writes one record in place and overwrites the oldest event once the memory is full,
+so it takes the same time however large the memory is.
+The records can be kept in a file with numpy.memmap instead of in memory, for memories larger than the RAM,
+memories kept from one run to the next, or memories read by other processes.
+"""
+from __future__ import print_function
+import json
+import os
+import random
+
+import numpy as np
+
+from checkpoint import write_atomic
+
+def record_dtype(inputs, board_inputs, valid_bytes):
+    """
+    Returns the dtype of the record of one event
+    """
+    return np.dtype([("state", np.float32, (inputs,)),
+                     ("action", np.int16),
+                     ("reward", np.float32),
+                     ("next_board_inputs", np.float32, (board_inputs,)),
+                     ("next_valid", np.uint8, (valid_bytes,)),
+                     ("terminal", bool)])
+
+class ReplayMemory(object):
+    """
+    Up to `capacity` events of State --> Action --> Reward --> State.
+
+    Each event is stored as:
+    `states`: the ANN inputs of the state the action was taken in.
+    `actions`: the ANN output of the action, rotation*10 + column.
+    `rewards`: the reward or punishment received.
+    `next_board_inputs`: the ANN inputs that describe the board the action led to. The inputs of the next state
+    with each tetromino are these after the inputs of that tetromino, given as the rows of `tetromino_inputs`.
+    `next_valid`: which of the `actions` outputs are valid for each tetromino on that board, packed 8 to a byte.
+    `terminal`: whether the action ended the game.
+
+    If `path` is given the records are kept in that file. An existing file is reopened with the events it holds,
+    so a run can start from the memory of an earlier one; `read_only` opens it without changing it.
+    Which records hold events is saved next to the file, in `path`.json, by `flush`, which is also called
+    every `flush_every` events. After a crash the file is reopened as it was at the last flush,
+    so up to `flush_every` of the newest events are missing.
+    Pickling a memory kept in a file, as a checkpoint does, copies the events it holds, so that unpickling it puts
+    the file back as it was; a checkpoint of a memory of tens of millions of events is as large as that memory.
+    """
+
+    def __init__(self, capacity, inputs, tetromino_inputs, actions=40, path=None, read_only=False, flush_every=10000):
+        if capacity < 1:
+            raise ValueError("The replay memory must hold at least one event")
+        self.capacity = capacity
+        self.tetromino_inputs = np.asarray(tetromino_inputs, dtype=np.float32)
+        self.tetrominoes, tetromino_input_size = self.tetromino_inputs.shape
+        self.number_of_actions = actions
+        self.path = path
+        self.read_only = read_only
+        self.flush_every = flush_every
+        #Row the next event is written to, how many rows hold events, and how many events were added since the last flush
+        self.position = 0
+        self.size = 0
+        self.unflushed = 0
+
+        dtype = record_dtype(inputs, inputs - tetromino_input_size, (self.tetrominoes * actions + 7) // 8)
+        if path is None:
+            self.records = np.zeros(capacity, dtype=dtype)
+        elif os.path.exists(path):
+            self.records = np.lib.format.open_memmap(path, mode='r' if read_only else 'r+')
+            if self.records.dtype != dtype or self.records.shape != (capacity,):
+                raise ValueError("{} does not hold a replay memory of {} events of this shape".format(path, capacity))
+            with open(path + ".json") as metadata_file:
+                metadata = json.load(metadata_file)
+            self.position = metadata["position"]
+            self.size = metadata["size"]
+        else:
+            self.records = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(capacity,))
+            self.flush()
+        self.set_fields()
+
+    def set_fields(self):
+        """
+        Names each field of the records, so `self.states[row]` is the state of the event in `row`
+        """
+        self.states = self.records["state"]
+        self.actions = self.records["action"]
+        self.rewards = self.records["reward"]
+        self.next_board_inputs = self.records["next_board_inputs"]
+        self.next_valid = self.records["next_valid"]
+        self.terminal = self.records["terminal"]
+
+    def flush(self):
+        """
+        Writes the records and which of them hold events to the file of the memory, if it has one
+        """
+        if self.path is None or self.read_only:
+            return
+        self.records.flush()
+        self.unflushed = 0
+        metadata = {"capacity": self.capacity,
+                    "inputs": self.records.dtype["state"].shape[0],
+                    "tetromino_inputs": self.tetromino_inputs.tolist(),
+                    "actions": self.number_of_actions,
+                    "position": self.position,
+                    "size": self.size}
+        write_atomic(self.path + ".json", json.dumps(metadata).encode())
+
+    def __getstate__(self):
+        """
+        A memory kept in a file is pickled as its path and a copy of the records that hold events.
+        The file keeps changing after the memory is pickled; the copy is what lets unpickling undo those changes.
+        A read only memory is pickled as its path alone.
+        """
+        state = dict(self.__dict__)
+        if self.path is not None:
+            self.flush()
+            for name in ("records", "states", "actions", "rewards", "next_board_inputs", "next_valid", "terminal"):
+                del state[name]
+            state["snapshot"] = None if self.read_only else np.array(self.records[:self.size])
+        return state
+
+    def __setstate__(self, state):
+        snapshot = state.pop("snapshot", None)
+        self.__dict__.update(state)
+        if self.path is not None:
+            self.records = np.lib.format.open_memmap(self.path, mode='r' if self.read_only else 'r+')
+            if snapshot is not None:
+                self.records[:len(snapshot)] = snapshot
+                self.flush()
+        self.set_fields()
+
+    def __len__(self):
+        return self.size
+
+    def append(self, state, action, reward, next_board_inputs, next_valid, terminal):
+        """
+        Remembers an event, forgetting the oldest one if the memory is full.
+        `next_valid` is a (tetrominoes, actions) mask of the valid actions on the next board.
+        """
+        row = self.position
+        self.states[row] = state
+        self.actions[row] = action
+        self.rewards[row] = reward
+        self.next_board_inputs[row] = next_board_inputs
+        self.next_valid[row] = np.packbits(np.asarray(next_valid, dtype=bool).ravel())
+        self.terminal[row] = terminal
+        self.position = (row + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        if self.path is not None:
+            self.unflushed += 1
+            if self.unflushed >= self.flush_every:
+                self.flush()
+
+    def sample(self, sample_size, rand=random):
+        """
+        Picks up to `sample_size` different events with `rand`.
+        Returns the states, actions, rewards, next state inputs with each tetromino as a (sample, tetrominoes, inputs) array,
+        (sample, tetrominoes, actions) valid action masks and terminal flags of the picked events.
+        """
+        #Events are numbered from the oldest, as they were when the memory was a list
+        picked = rand.sample(range(self.size), min(sample_size, self.size))
+        rows = (np.array(picked, dtype=np.intp) + (self.position if self.size == self.capacity else 0)) % self.capacity
+
+        shape = (len(rows), self.tetrominoes)
+        next_inputs = np.concatenate([np.broadcast_to(self.tetromino_inputs, shape + self.tetromino_inputs.shape[1:]),
+                                      np.broadcast_to(self.next_board_inputs[rows][:, None, :], shape + self.next_board_inputs.shape[1:])], axis=2)
+        next_valid = np.unpackbits(self.next_valid[rows], axis=1)[:, :self.tetrominoes * self.number_of_actions]
+        next_valid = next_valid.reshape(shape + (self.number_of_actions,)).astype(bool)
+        return self.states[rows], self.actions[rows], self.rewards[rows], next_inputs, next_valid, self.terminal[rows]
+
+def open_replay_memory(path, read_only=True):
+    """
+    Reopens the replay memory kept in the file `path`, read only by default so that other processes can sample it
+    """
+    with open(path + ".json") as metadata_file:
+        metadata = json.load(metadata_file)
+    return ReplayMemory(metadata["capacity"], metadata["inputs"], metadata["tetromino_inputs"], metadata["actions"],
+                        path=path, read_only=read_only)
+
+
+def test():
+    encodings = [[1, 0], [0, 1], [1, 1]]
+    memory = ReplayMemory(3, 4, encodings, actions=5)
+    assert len(memory) == 0
+    for event in range(5):
+        valid = [[(event + t + a) % 2 == 0 for a in range(5)] for t in range(3)]
+        memory.append([event, -event, 0, 1], event, event * 10, [event, event * 2], valid, event == 4)
+    assert len(memory) == 3
+    #Only the three newest events are left
+    states, actions, rewards, next_inputs, next_valid, terminal = memory.sample(10, random.Random(0))
+    assert sorted(actions.tolist()) == [2, 3, 4]
+    for i in range(3):
+        event = actions[i]
+        assert states[i].tolist() == [event, -event, 0, 1]
+        assert rewards[i] == event * 10
+        assert next_inputs[i].tolist() == [encoding + [event, event * 2] for encoding in encodings]
+        assert next_valid[i].tolist() == [[(event + t + a) % 2 == 0 for a in range(5)] for t in range(3)]
+        assert terminal[i] == (event == 4)
+
+    #Samples pick the same events, oldest first, as random.sample on a list of the events
+    memory = ReplayMemory(50, 3, [[0, 0]])
+    events = []
+    for event in range(120):
+        memory.append([0, 0, event], event % 40, 0, [0], [[False] * 40], False)
+        events = (events + [event])[-50:]
+        if event % 7 == 0:
+            states = memory.sample(32, random.Random(event))[0]
+            assert states[:, 2].tolist() == random.Random(event).sample(events, min(32, len(events)))
+
+    #A memory kept in a file is reopened with the same events
+    import pickle
+    import tempfile
+    path = os.path.join(tempfile.mkdtemp(), "replay.npy")
+    memory = ReplayMemory(50, 3, [[0, 0]], path=path)
+    for event in range(70):
+        memory.append([0, 0, event], event % 40, event, [0], [[event % 2 == 0] * 40], False)
+    memory.flush()
+    shared = open_replay_memory(path)
+    assert len(shared) == 50 and shared.position == 20
+    assert shared.sample(50, random.Random(1))[0].tolist() == memory.sample(50, random.Random(1))[0].tolist()
+    try:
+        shared.append([0, 0, 0], 0, 0, [0], [[False] * 40], False)
+        assert False
+    except ValueError:
+        pass
+
+    #Reopened for writing, it carries on from the oldest event
+    memory = ReplayMemory(50, 3, [[0, 0]], path=path)
+    memory.append([0, 0, 70], 30, 70, [0], [[True] * 40], True)
+    assert memory.rewards[20] == 70 and memory.position == 21
+    #Unpickling puts the file back as it was when the memory was pickled
+    pickled = pickle.dumps(memory)
+    expected = memory.sample(50, random.Random(2))[0].tolist()
+    for event in range(71, 90):
+        memory.append([0, 0, event], 0, event, [0], [[False] * 40], False)
+    unpickled = pickle.loads(pickled)
+    assert unpickled.position == 21 and unpickled.sample(50, random.Random(2))[0].tolist() == expected
+    assert open_replay_memory(path).sample(50, random.Random(2))[0].tolist() == expected
+
+    #The position is saved every flush_every events, so a memory that was never flushed by hand is reopened with them
+    crashed_path = os.path.join(os.path.dirname(path), "crashed.npy")
+    memory = ReplayMemory(50, 3, [[0, 0]], path=crashed_path, flush_every=10)
+    for event in range(25):
+        memory.append([0, 0, event], 0, event, [0], [[False] * 40], False)
+    assert len(open_replay_memory(crashed_path)) == 20
+    try:
+        ReplayMemory(60, 3, [[0, 0]], path=path)
+        assert False
+    except ValueError:
+        pass
+
+    print("All tests passed in {}, things seems to be working alright".format(__file__))
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,208 @@
+"""
+Buffered writing of results files.
+Rows are kept in memory and appended to their file in batches: once enough rows are waiting,
+when a row is written after enough time has passed since the last write, when the writer is closed,
+when the program exits, and when it is told to stop by a signal.
+There is no timer: a writer that is given no rows does not write the rows it holds until one of the others happens.
+"""
+from __future__ import print_function
+import atexit
+import csv
+import os
+import signal
+import time
+
+#Every writer that may still hold rows, flushed at exit and on signals
+open_writers = []
+
+#Signals that stop the program and are caught to flush the writers first, with the handlers they replaced
+flush_signals = [getattr(signal, name) for name in ("SIGTERM", "SIGHUP") if hasattr(signal, name)]
+previous_handlers = {}
+handlers_installed = False
+
+def flush_all():
+    """
+    Writes the waiting rows of every writer
+    """
+    for writer in list(open_writers):
+        writer.flush()
+
+def handle_signal(signum, frame):
+    """
+    Flushes every writer, then lets the signal do what it did before
+    """
+    flush_all()
+    previous = previous_handlers.get(signum, signal.SIG_DFL)
+    if callable(previous):
+        previous(signum, frame)
+    elif previous == signal.SIG_DFL:
+        signal.signal(signum, signal.SIG_DFL)
+        os.kill(os.getpid(), signum)
+
+def block_signals():
+    """
+    Holds back the signals in `flush_signals` until `unblock_signals` is called with the returned mask.
+    Returns None where signals cannot be blocked.
+    """
+    if not handlers_installed or not hasattr(signal, "pthread_sigmask"):
+        return None
+    return signal.pthread_sigmask(signal.SIG_BLOCK, flush_signals)
+
+def unblock_signals(mask):
+    """
+    Restores the mask returned by `block_signals`, which handles any signal that arrived in the meantime
+    """
+    if mask is not None:
+        signal.pthread_sigmask(signal.SIG_SETMASK, mask)
+
+def install_handlers():
+    """
+    Flushes every writer at exit and on the signals in `flush_signals`.
+    Signal handlers can only be set from the main thread, so elsewhere only exit is covered.
+    """
+    global handlers_installed
+    if handlers_installed:
+        return
+    handlers_installed = True
+    atexit.register(flush_all)
+    for signum in flush_signals:
+        try:
+            previous_handlers[signum] = signal.signal(signum, handle_signal)
+        except ValueError:
+            pass
+
+class ResultsWriter(object):
+    """
+    Appends rows to the file at `path` once `flush_every` rows are waiting, or when a row is written
+    `flush_interval` seconds or more after the last write.
+    If `header` is given and the file is new or empty, it is written as the first row.
+    With `truncate` the file is emptied first, so it only holds the header and the rows of this writer.
+    """
+
+    def __init__(self, path, header=None, flush_every=100, flush_interval=30, truncate=False):
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.rows = []
+        self.last_flush = time.time()
+        if truncate:
+            open(path, 'w').close()
+        if header is not None and (not os.path.exists(path) or os.path.getsize(path) == 0):
+            self.rows.append(list(header))
+            self.flush()
+        install_handlers()
+        open_writers.append(self)
+
+    def write(self, row):
+        """
+        Adds a row, writing the waiting rows if there are enough of them or enough time has passed
+        """
+        if self not in open_writers:
+            #Written to again after being closed
+            open_writers.append(self)
+        self.rows.append(row)
+        if len(self.rows) >= self.flush_every or time.time() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Appends every waiting row to the file with a single open and write.
+        The rows are only removed once they are written, so rows that could not be written are tried again.
+        """
+        if not self.rows:
+            return
+        #A signal that arrives while the rows are being written is handled once they are written and removed,
+        #so its flush neither loses them nor writes them twice
+        mask = block_signals()
+        try:
+            with open(self.path, 'a') as results_file:
+                csv.writer(results_file, lineterminator="\n").writerows(self.rows)
+            self.rows = []
+            self.last_flush = time.time()
+        finally:
+            unblock_signals(mask)
+
+    def close(self):
+        """
+        Writes the waiting rows and stops flushing this writer at exit and on signals
+        """
+        self.flush()
+        if self in open_writers:
+            open_writers.remove(self)
+
+
+def test():
+    import tempfile
+
+    path = os.path.join(tempfile.mkdtemp(), "results.csv")
+    writer = ResultsWriter(path, header=["episode", "lines"], flush_every=3, flush_interval=3600)
+    assert open(path).read() == "episode,lines\n"
+    writer.write([0, 5])
+    writer.write([1, 2])
+    assert open(path).read() == "episode,lines\n"
+    writer.write([2, 7])
+    assert open(path).read() == "episode,lines\n0,5\n1,2\n2,7\n"
+    writer.write([3, 1])
+    flush_all()
+    assert open(path).read().endswith("2,7\n3,1\n")
+    writer.close()
+    assert writer not in open_writers
+
+    #Reopening an existing file does not write the header again
+    writer = ResultsWriter(path, header=["episode", "lines"], flush_every=1)
+    writer.write([4, 0])
+    writer.close()
+    assert open(path).read().count("episode") == 1
+
+    #Rows are written once enough time has passed
+    writer = ResultsWriter(path, flush_every=1000, flush_interval=0)
+    writer.write([5, 0])
+    assert open(path).read().endswith("4,0\n5,0\n")
+    writer.close()
+
+    #Truncating starts the file again from the header
+    writer = ResultsWriter(path, header=["episode", "lines"], truncate=True)
+    assert open(path).read() == "episode,lines\n"
+    assert writer in open_writers
+    writer.close()
+    #A closed writer that is written to again is flushed at exit again
+    writer.write([6, 0])
+    assert writer in open_writers
+    flush_all()
+    assert open(path).read() == "episode,lines\n6,0\n"
+    writer.close()
+    assert not open_writers
+
+    #Rows that could not be written are kept
+    writer = ResultsWriter(os.path.dirname(path), flush_every=1000)
+    writer.write([7, 0])
+    try:
+        writer.flush()
+        assert False
+    except (IOError, OSError):
+        pass
+    assert writer.rows == [[7, 0]]
+    writer.path = path
+    writer.close()
+    assert open(path).read().endswith("6,0\n7,0\n")
+
+    #A signal that arrives while rows are being written is handled after they are written, and they are written once
+    if hasattr(signal, "SIGHUP") and hasattr(signal, "pthread_sigmask") and signal.getsignal(signal.SIGHUP) == handle_signal:
+        class Signalling(object):
+            def __str__(self):
+                os.kill(os.getpid(), signal.SIGHUP)
+                return "8"
+
+        handled = []
+        previous = previous_handlers.get(signal.SIGHUP)
+        previous_handlers[signal.SIGHUP] = lambda signum, frame: handled.append(open(path).read())
+        writer = ResultsWriter(path, flush_every=1)
+        writer.write([Signalling(), 0])
+        previous_handlers[signal.SIGHUP] = previous
+        assert handled == [open(path).read()] and handled[0].endswith("7,0\n8,0\n")
+        writer.close()
+
+    print("All tests passed in {}, things seems to be working alright".format(__file__))
+
+if __name__ == '__main__':
+    test()
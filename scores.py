@@ -1,9 +1,16 @@
 import os
 
+from results import ResultsWriter
+
 scorefile = os.path.join(os.path.dirname(__file__), ".highscores")
 
+#Scores are written in batches, so a long run of episodes does not open the file after every game
+score_writer = None
+
 def load_score():
     """ Returns the highest score, or 0 if no one has scored yet """
+    if score_writer is not None:
+        score_writer.flush()
     try:
         with open(scorefile) as file:
             scores = sorted([int(score.strip())
@@ -17,7 +24,10 @@ def load_score():
 def write_score(score):
     """
     Writes score to file.
+    The score is buffered and written with the scores of later games, at the latest when the program exits.
     """
+    global score_writer
     assert str(score).isdigit()
-    with open(scorefile, 'a') as file:
-        file.write("{}\n".format(score))
+    if score_writer is None:
+        score_writer = ResultsWriter(scorefile)
+    score_writer.write([score])
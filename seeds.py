@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+"""
+Seeds of the games played in each episode.
+Seeds are generated from one master seed and saved as a NumPy .npy file, which is memory-mapped
+so that finding the seed of an episode is a single lookup however many seeds there are.
+
+Usage: python3 seeds.py <number of seeds> [--master-seed 0] [--output seeds.npy]
+"""
+from __future__ import print_function
+import argparse
+import csv
+import os
+import random
+
+import numpy as np
+
+SEEDS_FILE = "seeds.npy"
+
+#Seeds file used before seeds.npy; still read if there is no seeds.npy
+CSV_SEEDS_FILE = "seeds.csv"
+
+def generate_seeds(number_of_seeds, master_seed=0):
+    """
+    Returns `number_of_seeds` seeds worked out from `master_seed`; the same master seed always gives the same seeds
+    """
+    generator = random.Random(master_seed)
+    return np.array([generator.randrange(2**32) for _ in range(number_of_seeds)], dtype=np.uint32)
+
+def write_seeds(seeds, path=SEEDS_FILE):
+    """
+    Saves seeds to a .npy file, 4 bytes a seed
+    """
+    np.save(path, np.asarray(seeds, dtype=np.uint32))
+
+class SeedStore(object):
+    """
+    The seed of every episode, from `start` up to but not including `stop`.
+    Episode 0 of the store is episode `start` of the seeds it was made from, so a shard can be played
+    by an agent that starts from episode 0 like any other.
+    """
+
+    def __init__(self, seeds, start=0, stop=None):
+        stop = len(seeds) if stop is None else min(stop, len(seeds))
+        self.seeds = seeds
+        self.start = start
+        self.stop = max(start, stop)
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def seed(self, episode):
+        """
+        Returns the seed of `episode`, or None if there is no seed for it
+        """
+        if 0 <= episode < len(self):
+            seed = self.seeds[self.start + episode]
+            return seed if seed is None or isinstance(seed, str) else int(seed)
+        return None
+
+    def shard(self, worker, workers):
+        """
+        Splits the episodes into `workers` consecutive ranges as even as possible and returns the range of `worker`
+        """
+        if not 0 <= worker < workers:
+            raise ValueError("Worker {} is not one of {} workers".format(worker, workers))
+        size, extra = divmod(len(self), workers)
+        first = self.start + worker * size + min(worker, extra)
+        return SeedStore(self.seeds, first, first + size + (1 if worker < extra else 0))
+
+def load_csv_seeds(path=CSV_SEEDS_FILE):
+    """
+    Reads a seeds.csv file of episode,seed rows into a list, once.
+    The seeds are kept as the strings in the file, as random.seed was always given them as strings.
+    """
+    seeds = {}
+    with open(path, 'r') as seed_csv:
+        for row in csv.reader(seed_csv, delimiter=',', quotechar='|'):
+            if row:
+                seeds.setdefault(int(row[0]), row[1])
+    return [seeds.get(episode) for episode in range(max(seeds) + 1 if seeds else 0)]
+
+def load_seeds(path=None):
+    """
+    Returns a SeedStore of the seeds in `path`.
+    By default seeds.npy is used, or seeds.csv if there is no seeds.npy.
+    """
+    if path is None:
+        path = SEEDS_FILE if os.path.exists(SEEDS_FILE) or not os.path.exists(CSV_SEEDS_FILE) else CSV_SEEDS_FILE
+    if path.endswith(".csv"):
+        return SeedStore(load_csv_seeds(path))
+    return SeedStore(np.load(path, mmap_mode='r'))
+
+
+def test():
+    import tempfile
+
+    seeds = generate_seeds(100, master_seed=3)
+    assert seeds.dtype == np.uint32 and len(seeds) == 100
+    assert (seeds == generate_seeds(100, master_seed=3)).all()
+    assert not (seeds == generate_seeds(100, master_seed=4)).all()
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "seeds.npy")
+    write_seeds(seeds, path)
+    store = load_seeds(path)
+    assert len(store) == 100
+    assert [store.seed(episode) for episode in range(100)] == seeds.tolist()
+    assert store.seed(100) is None and store.seed(-1) is None
+
+    #Shards cover every episode once, in order
+    shards = [store.shard(worker, 7) for worker in range(7)]
+    assert sorted(len(shard) for shard in shards) == [14] * 5 + [15] * 2
+    assert [shard.seed(episode) for shard in shards for episode in range(len(shard))] == seeds.tolist()
+    assert shards[2].seed(len(shards[2])) is None
+
+    csv_path = os.path.join(directory, "seeds.csv")
+    with open(csv_path, 'w') as seed_csv:
+        seed_csv.write("1,222\n0,111\n2,333\n4,555\n")
+    csv_store = load_seeds(csv_path)
+    assert [csv_store.seed(episode) for episode in range(6)] == ["111", "222", "333", None, "555", None]
+
+    print("All tests passed in {}, things seems to be working alright".format(__file__))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generates the seeds of the games played in each episode.")
+    parser.add_argument("number_of_seeds", type=int, nargs="?", help="number of seeds, one per episode; runs the tests if not given")
+    parser.add_argument("--master-seed", type=int, default=0, help="seed the seeds are generated from")
+    parser.add_argument("--output", default=SEEDS_FILE, help="file the seeds are written to")
+    arguments = parser.parse_args()
+    if arguments.number_of_seeds is None:
+        test()
+    else:
+        write_seeds(generate_seeds(arguments.number_of_seeds, arguments.master_seed), arguments.output)
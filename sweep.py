@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+"""
+Runs a sweep of agents with different hyperparameters in one interpreter.
+Keras, the piece tables and the seeds are loaded once for the whole sweep; each run only gets a new agent and game.
+
+A sweep is a JSON list of configs. Each config names its run and gives any of the arguments of agent.agent,
+which default to those of the DQN modes of matris.py:
+
+    [{"name": "hh-decay-0.01", "height": true, "holes": true},
+     {"name": "hh-decay-0.001", "height": true, "holes": true, "epsilon_decay": 0.001},
+     {"name": "no-memory-5000", "memory_size": 5000, "sample_size": 64}]
+
+Usage: python3 sweep.py <sweep.json> [--episodes 10000] [--interleave]
+"""
+from __future__ import print_function
+import argparse
+import json
+import os
+import random
+
+import agent
+from core import MatrisCore, GameOver
+from seeds import load_seeds
+
+#Arguments of the agents made by the -hh, -ho, -hi and -no modes
+DEFAULTS = dict(random_moves=False, rewards_as_lines=True, epsilon=1, epsilon_decay=0.01, epsilon_minimum=0.01,
+                memory_size=1000, sample_size=32, reset_steps=1000)
+
+def build_agent(config, episodes, results_directory="results", seeds=None):
+    """
+    Returns an agent made from `config`, which writes its results to `results_directory`/<name>.csv
+    """
+    settings = dict(DEFAULTS)
+    settings.update((key, value) for key, value in config.items() if key not in ("name", "episodes"))
+    return agent.agent([], config.get("episodes", episodes), results_path=os.path.join(results_directory, config["name"]),
+                       seeds=seeds, **settings)
+
+def play_episode(game):
+    """
+    Plays one episode of `game`. Returns False once the agent has played all of its episodes.
+    """
+    episode = game.agent.get_current_episode()
+    try:
+        while game.agent.get_current_episode() == episode:
+            game.agent_step()
+    except GameOver:
+        return False
+    return True
+
+def run_sweep(configs, episodes=10000, interleave=False, results_directory="results", seeds=None):
+    """
+    Trains an agent for every config, one after another, or an episode of each in turn if `interleave` is set.
+    Returns the agents, in the order of `configs`.
+    The games draw their tetrominoes from the `random` module, so each interleaved game keeps its own state
+    of the generator between turns and plays the same games it would have played on its own.
+    """
+    names = [config["name"] for config in configs]
+    if len(set(names)) != len(names):
+        raise ValueError("Every config of a sweep needs its own name")
+    if not os.path.isdir(results_directory):
+        os.makedirs(results_directory)
+    seeds = load_seeds() if seeds is None else seeds
+
+    if not interleave:
+        agents = []
+        for config in configs:
+            game = MatrisCore(build_agent(config, episodes, results_directory, seeds))
+            game.run()
+            agents.append(game.agent)
+        return agents
+
+    games = []
+    random_states = []
+    for config in configs:
+        games.append(MatrisCore(build_agent(config, episodes, results_directory, seeds)))
+        random_states.append(random.getstate())
+    playing = list(range(len(games)))
+    while playing:
+        still_playing = []
+        for run in playing:
+            random.setstate(random_states[run])
+            if play_episode(games[run]):
+                still_playing.append(run)
+            random_states[run] = random.getstate()
+        playing = still_playing
+    return [game.agent for game in games]
+
+
+def test():
+    import csv
+    import tempfile
+    import scores
+    from results import open_writers
+    from seeds import SeedStore, generate_seeds
+
+    #Scores of the test games are not kept
+    scores.scorefile = os.path.join(tempfile.mkdtemp(), ".highscores")
+    seeds = SeedStore(generate_seeds(10, master_seed=1))
+    configs = [{"name": "random-a", "random_moves": True}, {"name": "random-b", "random_moves": True, "episodes": 2}]
+    results = {}
+    for interleave in (False, True):
+        directory = tempfile.mkdtemp()
+        agents = run_sweep(configs, episodes=3, interleave=interleave, results_directory=directory, seeds=seeds)
+        assert [sweep_agent.get_current_episode() for sweep_agent in agents] == [3, 2]
+        #Finished runs no longer keep their results writers open
+        assert not any(sweep_agent.results in open_writers for sweep_agent in agents)
+        for config in configs:
+            with open(os.path.join(directory, config["name"] + ".csv")) as results_file:
+                results[interleave, config["name"]] = [row[:4] for row in csv.reader(results_file)][1:]
+    #Both agents play the same games whether they take turns or not
+    for config in configs:
+        assert results[False, config["name"]] == results[True, config["name"]]
+    assert len(results[False, "random-a"]) == 3 and len(results[False, "random-b"]) == 2
+
+    try:
+        run_sweep([{"name": "same"}, {"name": "same"}], seeds=seeds)
+        assert False
+    except ValueError:
+        pass
+
+    print("All tests passed in {}, things seems to be working alright".format(__file__))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Trains MaTris agents with every config of a sweep in one process.")
+    parser.add_argument("sweep", nargs="?", help="JSON file with the list of configs; runs the tests if not given")
+    parser.add_argument("--episodes", type=int, default=10000, help="episodes of each run, unless its config gives its own")
+    parser.add_argument("--interleave", action="store_true", help="play an episode of each run in turn instead of one run after another")
+    parser.add_argument("--results", default="results", help="directory the results of each run are written to")
+    arguments = parser.parse_args()
+    if arguments.sweep is None:
+        test()
+    else:
+        with open(arguments.sweep) as sweep_file:
+            run_sweep(json.load(sweep_file), arguments.episodes, arguments.interleave, arguments.results)
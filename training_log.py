@@ -0,0 +1,99 @@
+"""
+Logging of training runs.
+Messages go to the "matris" logger on stderr. By default only warnings and errors are shown, so training is quiet:
+  * DEBUG shows a report of every `piece_every`th tetromino placed, with the board if `boards` is set.
+  * INFO shows a summary of every `episode_every`th episode and the start and end of runs.
+  * WARNING and ERROR show problems, with the board they happened on.
+
+The level and sampling can be given on the command line of core.py and matris.py:
+--log-level debug --log-pieces 100 --log-episodes 10 --log-boards
+"""
+from __future__ import print_function
+import argparse
+import logging
+import sys
+
+logger = logging.getLogger("matris")
+
+LEVELS = {"debug": logging.DEBUG, "info": logging.INFO, "warning": logging.WARNING, "error": logging.ERROR}
+
+#Sampling of the per piece and per episode messages; 1 logs every one
+piece_every = 1
+episode_every = 1
+#Whether piece reports include the board
+boards = False
+
+def configure(level=logging.WARNING, pieces=1, episodes=1, show_boards=False, stream=None):
+    """
+    Sets the level of the "matris" logger, how often pieces and episodes are logged and whether boards are shown
+    """
+    global piece_every, episode_every, boards
+    if isinstance(level, str):
+        level = LEVELS[level.lower()]
+    piece_every = max(1, pieces)
+    episode_every = max(1, episodes)
+    boards = show_boards
+
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stderr if stream is None else stream)
+        handler.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
+        logger.addHandler(handler)
+        logger.propagate = False
+    logger.setLevel(level)
+
+def configure_from_arguments(argv):
+    """
+    Configures logging from the --log-* options in `argv` and returns `argv` without them
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--log-level", default="warning", choices=sorted(LEVELS))
+    parser.add_argument("--log-pieces", type=int, default=1)
+    parser.add_argument("--log-episodes", type=int, default=1)
+    parser.add_argument("--log-boards", action="store_true")
+    options, remaining = parser.parse_known_args(argv[1:])
+    configure(options.log_level, options.log_pieces, options.log_episodes, options.log_boards)
+    return argv[:1] + remaining
+
+def piece_sampled(piece):
+    """
+    Returns True if the report of the `piece`th tetromino placed should be logged
+    """
+    return logger.isEnabledFor(logging.DEBUG) and piece % piece_every == 0
+
+def episode_sampled(episode):
+    """
+    Returns True if the summary of `episode` should be logged
+    """
+    return logger.isEnabledFor(logging.INFO) and episode % episode_every == 0
+
+def format_board(rows):
+    """
+    Returns a board as lines of comma separated cells, one line per row
+    """
+    return "".join([",".join([str(cell) for cell in row]) + "\n" for row in rows])
+
+
+def test():
+    import io
+
+    assert format_board([[0, 1], [1, 1]]) == "0,1\n1,1\n"
+    assert format_board([]) == ""
+
+    stream = io.StringIO()
+    logger.handlers = []
+    configure(stream=stream)
+    assert not piece_sampled(0) and not episode_sampled(0)
+    logger.info("hidden")
+    logger.warning("shown")
+    assert stream.getvalue() == "WARNING: shown\n"
+
+    argv = configure_from_arguments(["core.py", "-hh", "--log-level", "debug", "100", "--log-pieces", "5", "--log-boards"])
+    assert argv == ["core.py", "-hh", "100"]
+    assert piece_sampled(10) and not piece_sampled(11)
+    assert episode_sampled(3) and boards
+
+    configure()
+    print("All tests passed in {}, things seems to be working alright".format(__file__))
+
+if __name__ == '__main__':
+    test()